@@ -152,46 +152,59 @@ class CategoryListViewTest(TestCase):
         self.response = self.client.get(reverse("category_list"))
         self.assertContains(self.response, self.category.name, status_code=200)
 
-
-class CategoryDetailsViewTest(TestCase):
-    def setUp(self):
-        casual_user = get_user_model().objects.create(
-            username="testuser",
+    def test_pagination(self):
+        for index in range(20):
+            Category.objects.create(name=f"category {index:02}")
+        response = self.client.get(reverse("category_list"), {"page": 2})
+        self.assertContains(response, "Page 2 of 2.")
+        # 20 categories on first page, 5 rows of 4.
+        self.assertEqual(
+            list(response.context["category_rows"]),
+            [[self.category, "blank", "blank", "blank"]],
         )
-        casual_user.set_password("testpass123")
-        casual_user.save()
 
-        staff_user = get_user_model().objects.create(
-            username="staffuser",
-            is_staff=True,
-        )
-        staff_user.set_password("testpass123")
-        staff_user.save()
 
-        self.category = Category.objects.create(
-            name="test category",
-        )
-        self.product1 = Product.objects.create(
-            name="product_name",
-            producer="test_producer",
-            price=123,
-            count=1000,
-        )
-        self.product2 = Product.objects.create(
-            name="product_name2",
-            producer="test_producer2",
-            price=321,
-            count=1000,
-        )
-        self.product3 = Product.objects.create(
-            name="product_name2",
-            producer="test_producer2",
-            price=1,
-            count=1000,
-        )
-        self.category.products.add(self.product1)
-        self.category.products.add(self.product2)
-        self.category.products.add(self.product3)
+class CategoryDetailsViewTest(TestCase):
+    def setUp(self):
+        # Cached pages are made stale on commit of changes.
+        with self.captureOnCommitCallbacks(execute=True):
+            casual_user = get_user_model().objects.create(
+                username="testuser",
+            )
+            casual_user.set_password("testpass123")
+            casual_user.save()
+
+            staff_user = get_user_model().objects.create(
+                username="staffuser",
+                is_staff=True,
+            )
+            staff_user.set_password("testpass123")
+            staff_user.save()
+
+            self.category = Category.objects.create(
+                name="test category",
+            )
+            self.product1 = Product.objects.create(
+                name="product_name",
+                producer="test_producer",
+                price=123,
+                count=1000,
+            )
+            self.product2 = Product.objects.create(
+                name="product_name2",
+                producer="test_producer2",
+                price=321,
+                count=1000,
+            )
+            self.product3 = Product.objects.create(
+                name="product_name2",
+                producer="test_producer2",
+                price=1,
+                count=1000,
+            )
+            self.category.products.add(self.product1)
+            self.category.products.add(self.product2)
+            self.category.products.add(self.product3)
         assert self.client.login(username="testuser", password="testpass123")
         self.response = self.client.get(
             reverse("category_details", kwargs={"pk": self.category.pk})
@@ -222,21 +235,33 @@ class CategoryDetailsViewTest(TestCase):
 
     def test_add_to_cart(self):
         product_count = self.product1.count
-        self.response = self.client.post(
-            reverse(
-                "category_details",
-                kwargs={
-                    "pk": self.category.pk,
+        url = reverse("category_details", kwargs={"pk": self.category.pk})
+        # Cached card of product is stale once change of stock is committed.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                url,
+                data={
+                    "cart_add_button": "Add to cart",
+                    "product_pk": self.product1.pk,
                 },
-            ),
-            data={
-                "cart_add_button": "Add to cart",
-                "product_pk": self.product1.pk,
-            },
-        )
+            )
         self.product1.refresh_from_db()
         self.assertEqual(product_count - 1, self.product1.count)
-        self.assertContains(self.response, str(self.product1.count) + " left.")
+        self.assertContains(self.client.get(url), str(self.product1.count) + " left.")
+
+    def test_facets(self):
+        self.assertEqual(
+            [
+                (facet["label"], facet["count"])
+                for facet in self.response.context["facets"]["producer"]
+            ],
+            [("test_producer2", 2), ("test_producer", 1)],
+        )
+        response = self.client.get(
+            reverse("category_details", kwargs={"pk": self.category.pk}),
+            {"price": "0-1000", "producer": "test_producer2"},
+        )
+        self.assertContains(response, "cart_add_button", count=2)
 
     def test_add_to_cart_as_unauthorized_user(self):
         self.client.logout()
@@ -1,4 +1,5 @@
 from django.urls import path
+from pages.cache import shared_page_cache
 from .views import (
     CategoryListView,
     CategoryDeleteView,
@@ -21,7 +22,11 @@ urlpatterns = [
         name="category_update",
     ),
     path("create", CategoryCreateView.as_view(), name="category_create"),
-    path("<int:pk>", CategoryDetailsView.as_view(), name="category_details"),
+    path(
+        "<int:pk>",
+        shared_page_cache(CategoryDetailsView.as_view()),
+        name="category_details",
+    ),
     path(
         "<int:pk>/checkbox",
         CategoryManageProductsView.as_view(),
@@ -8,7 +8,6 @@ from django.views.generic import (
     UpdateView,
     DeleteView,
 )
-from django.db.models import Prefetch
 from django.contrib.auth.mixins import (
     LoginRequiredMixin,
 )
@@ -17,41 +16,34 @@ from .models import Category
 
 
 from accounts.utils.utils import StaffPrivilegesRequiredMixin
-from transactions.views import CartView
+from transactions.views import add_to_cart
 from products.views import ProductListView
 from products.models import get_product_model
 from products.views import CheckboxView
-from images.models import Image
+from products.facets import Facets
+from products.pagination import RowPaginator, split_items_to_rows
 
 
 class CategoryListView(ListView):
     model = Category
     template_name = "category_list.html"
     success_url = reverse_lazy("category_list")
+    ordering = "name"
     rows_count = 4
+    paginate_by = 5  # rows
 
     def get(self, request, *args, **kwargs):
         self.request = request
         return super().get(self, request, *args, **kwargs)
 
-    def get_context_data(self, **kwargs):
-        category_rows = list()
-        row = list()
-        for index, object in enumerate(self.object_list):
-            row.append(object)
-            if ((index + 1) % self.rows_count) == 0:
-                category_rows.append(row)
-                row = list()
-
-        # Add blank items to row to make last row the same length
-        for index in range(
-            self.rows_count - (self.object_list.count() % self.rows_count)
-        ):
-            row.append("blank")
-        category_rows.append(row)
+    def get_paginator(self, queryset, per_page, **kwargs):
+        return RowPaginator(
+            queryset, per_page, self.rows_count, split=split_items_to_rows, **kwargs
+        )
 
+    def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["category_rows"] = category_rows
+        context["category_rows"] = context["page_obj"]
 
         if "category_create" in self.request.POST:
             self.request.method = "GET"
@@ -72,9 +64,7 @@ class CategoryListView(ListView):
                 .fields["name"]
                 .widget.render(
                     "name",
-                    context["object_list"]
-                    .get(pk=self.request.POST["category_pk"])
-                    .name,
+                    self.object_list.get(pk=self.request.POST["category_pk"]).name,
                 )
             )
         return context
@@ -128,24 +118,27 @@ class CategoryDetailsView(DetailView):
         # TODO crate funciton to paginate queryset, and get thumbnails
         # use ProductListView context, with category associated products queryset.
         context = super().get_context_data(**kwargs)
+        facets = Facets(
+            self.object.products.all(),
+            self.request.GET,
+            scope=f"category:{self.object.pk}",
+        )
+        context["facets"] = facets.get_counts()
+        context["facets_query"] = facets.query_string()
         associated_products_context = ProductListView(
-            queryset=self.object.products.prefetch_related(
-                Prefetch("images", Image.objects.filter(place=0), to_attr="thumbnail")
-            ),
+            queryset=facets.filter(),
             kwargs=kwargs,
             request=self.request,
+            pagination="page",
         ).get_context_data()
-        merged_context = {**context, **associated_products_context}
+        # Page's context, e.g. view, takes precedence over product list's one.
+        merged_context = {**associated_products_context, **context}
         return merged_context
 
     def post(self, request, *args, **kwargs):
         if "cart_add_button" in request.POST:
             # add to cart button clicked
-            if request.user.is_authenticated:
-                cart = request.user.carts.get(transaction=None)
-                CartView.as_view()(
-                    request, pk=cart.pk, product_pk=request.POST["product_pk"]
-                )
+            add_to_cart(request, request.POST["product_pk"])
         return render(
             request,
             self.template_name,
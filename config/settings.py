@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     "whitenoise.runserver_nostatic",
     "django.contrib.staticfiles",
     "django.contrib.sites",
+    "django.contrib.postgres",
     # Local
     "accounts",
     "pages",
@@ -66,9 +67,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
-    "django.middleware.cache.UpdateCacheMiddleware",
     "django.middleware.common.CommonMiddleware",
-    "django.middleware.cache.FetchFromCacheMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -202,9 +201,53 @@ CACHES = {
         "OPTIONS": {},
     }
 }
-CACHE_MIDDLEWARE_ALIAS = "default"
-CACHE_MIDDLEWARE_SECONDS = 0  # TODO: per-view, template caches
-CACHE_MIDDLEWARE_KEY_PREFIX = ""
+# Catalog, category and product pages are cached for every user until catalog
+# changes, or stock of product shown on page changes, up to timeout in seconds. 0
+# turns the cache off.
+PAGE_CACHE_TIMEOUT = env.int("DJANGO_PAGE_CACHE_TIMEOUT", default=10 * 60)
+
+# SEARCH SETTINGS
+# Name of backend from products.search.SEARCH_BACKENDS used by search page.
+# "index" matches words of phrase with beginnings of products' words, e.g. "hoe"
+# matches "Hoes" but not "shoehorn", which "icontains" also matches.
+SEARCH_BACKEND = env.str("DJANGO_SEARCH_BACKEND", default="index")
+# PostgreSQL text search configuration used by 'fulltext' backend.
+SEARCH_FULLTEXT_CONFIG = env.str("DJANGO_SEARCH_FULLTEXT_CONFIG", default="english")
+# Minimal word similarity (0-1) of phrase's word to match product in 'trigram'
+# backend.
+SEARCH_TRIGRAM_THRESHOLD = env.float("DJANGO_SEARCH_TRIGRAM_THRESHOLD", default=0.5)
+# Search results are cached until product changes, up to timeout in seconds.
+SEARCH_CACHE_TIMEOUT = env.int("DJANGO_SEARCH_CACHE_TIMEOUT", default=60 * 60)
+# Number of best matches listed, cached and counted in facets for phrase. Search
+# page tells when phrase has more matches.
+SEARCH_CACHE_MAX_RESULTS = env.int("DJANGO_SEARCH_CACHE_MAX_RESULTS", default=1000)
+
+# PRODUCT LIST SETTINGS
+# "cursor" paginates product list with keyset cursors, every page costs the same
+# and no COUNT(*) is run. "page" paginates with page numbers and total count.
+PRODUCT_LIST_PAGINATION = env.str("DJANGO_PRODUCT_LIST_PAGINATION", default="cursor")
+# Rendered product cards are cached until product changes, up to timeout in seconds.
+PRODUCT_CARD_CACHE_TIMEOUT = env.int(
+    "DJANGO_PRODUCT_CARD_CACHE_TIMEOUT", default=24 * 60 * 60
+)
+# Summary of user's cart shown in navigation is cached until cart changes, up to
+# timeout in seconds. Changes of prices of products in cart show after it.
+CART_SUMMARY_TIMEOUT = env.int("DJANGO_CART_SUMMARY_TIMEOUT", default=60 * 60)
+# Products added to cart are held in stock for timeout in seconds since cart was
+# last changed, then release_reservations command returns them to stock.
+CART_RESERVATION_TIMEOUT = env.int("DJANGO_CART_RESERVATION_TIMEOUT", default=30 * 60)
+
+# SESSION SETTINGS
+# Sessions, with carts of not logged in users, are read from cache and written
+# through to database, so logins and guest carts survive eviction from cache and
+# its restart. It costs database write per changed session, guest carts still add
+# no cart rows. "django.contrib.sessions.backends.cache" skips the writes, but
+# loses sessions when cache evicts or clears keys, so use it only with
+# SESSION_CACHE_ALIAS naming cache which doesn't evict keys.
+SESSION_ENGINE = env.str(
+    "DJANGO_SESSION_ENGINE", default="django.contrib.sessions.backends.cached_db"
+)
+SESSION_CACHE_ALIAS = env.str("DJANGO_SESSION_CACHE_ALIAS", default="default")
 
 # Security cofig
 # security.W016
@@ -17,8 +17,27 @@ class ImageForm(forms.ModelForm):
         self.fields["place"].required = False
 
 
+class MultipleFileInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+class MultipleImageField(forms.ImageField):
+    """Image field accepting many uploaded images, validates each of them."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("widget", MultipleFileInput())
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        if isinstance(data, (list, tuple)):
+            if not data:
+                return super().clean(None, initial)
+            return [super(MultipleImageField, self).clean(file, initial) for file in data]
+        return super().clean(data, initial)
+
+
 class ImagesManagerUploadImageForm(forms.ModelForm):
-    image = forms.ImageField(widget=forms.FileInput(attrs={"multiple": True}))
+    image = MultipleImageField()
     product_pk = forms.UUIDField(widget=forms.HiddenInput(), required=True)
 
     class Meta:
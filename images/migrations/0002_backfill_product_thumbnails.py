@@ -0,0 +1,38 @@
+# Generated by Django 4.1.13 on 2026-10-18 18:52
+
+from django.db import migrations
+
+
+def backfill_thumbnails(apps, schema_editor):
+    Image = apps.get_model("images", "Image")
+    Product = apps.get_model("products", "Product")
+    products = list()
+    seen = set()
+    for image in Image.objects.exclude(image="").order_by("product", "place").iterator():
+        if image.product_id in seen:
+            continue
+        seen.add(image.product_id)
+        product = Product(pk=image.product_id, thumbnail=image.image.name)
+        try:
+            product.thumbnail_width = image.image.width
+            product.thumbnail_height = image.image.height
+        except (OSError, ValueError):
+            pass
+        products.append(product)
+    Product.objects.bulk_update(
+        products,
+        ["thumbnail", "thumbnail_width", "thumbnail_height"],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0001_initial'),
+        ('products', '0021_product_thumbnail'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_thumbnails, migrations.RunPython.noop),
+    ]
@@ -15,3 +15,24 @@ class Image(models.Model):
     def delete(self, using=None, keep_parents=False):
         self.image.storage.delete(self.image.name)
         super().delete()
+
+
+THUMBNAIL_FIELDS = ("thumbnail", "thumbnail_width", "thumbnail_height")
+
+
+def update_product_thumbnail(product):
+    """Copy path and dimensions of product's first image to its thumbnail fields.
+    Has to be called whenever product's images are added, deleted or reordered."""
+    image = Image.objects.filter(product=product).order_by("place").first()
+    thumbnail, width, height = "", None, None
+    if image is not None and image.image:
+        thumbnail = image.image.name
+        try:
+            width, height = image.image.width, image.image.height
+        except (OSError, ValueError):
+            # File is missing or isn't an image, path is still usable.
+            pass
+    product.thumbnail = thumbnail
+    product.thumbnail_width = width
+    product.thumbnail_height = height
+    product.save(update_fields=THUMBNAIL_FIELDS)
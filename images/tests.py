@@ -1,9 +1,12 @@
 from products.models import get_product_model
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 import requests
+import tempfile
+from io import BytesIO
+from PIL import Image as PILImage
 
 
 # Create your tests here.
@@ -195,3 +198,75 @@ class ImageManagerTest(TestCase):
         self.assertEqual(
             len(set(self.product.images.values_list("place", flat=True))), images_count
         )
+
+
+def make_image(name, size):
+    file = BytesIO()
+    PILImage.new("RGB", size).save(file, "PNG")
+    return SimpleUploadedFile(name, file.getvalue(), content_type="image/png")
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ProductThumbnailTest(TestCase):
+    def setUp(self):
+        self.product = get_product_model().objects.create(
+            name="Hoe",
+            producer="Universe",
+            price=25,
+            count=1000,
+        )
+        staff_user = get_user_model().objects.create(
+            username="staffuser",
+            is_staff=True,
+        )
+        self.client.force_login(staff_user)
+        self.url = reverse("images_manager", kwargs={"pk": self.product.pk})
+
+    def test_thumbnail_kept_in_sync(self):
+        self.client.post(
+            self.url,
+            data={
+                "upload_images": "upload_images",
+                "image": [
+                    make_image("first.png", (30, 20)),
+                    make_image("second.png", (10, 40)),
+                ],
+                "product_pk": self.product.pk,
+            },
+        )
+        first, second = self.product.images.order_by("place")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.thumbnail.name, first.image.name)
+        self.assertEqual(
+            (self.product.thumbnail_width, self.product.thumbnail_height), (30, 20)
+        )
+
+        self.client.post(self.url, data={"image_pk": second.pk, "move_up": "move_up"})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.thumbnail.name, second.image.name)
+        self.assertEqual(
+            (self.product.thumbnail_width, self.product.thumbnail_height), (10, 40)
+        )
+
+        self.client.post(
+            self.url,
+            data={
+                "image_pk": second.pk,
+                "delete": "delete",
+                "product_pk": self.product.pk,
+            },
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.thumbnail.name, first.image.name)
+
+        self.client.post(
+            self.url,
+            data={
+                "image_pk": first.pk,
+                "delete": "delete",
+                "product_pk": self.product.pk,
+            },
+        )
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.thumbnail)
+        self.assertIsNone(self.product.thumbnail_width)
@@ -5,7 +5,7 @@ from django.views.generic import (
     DeleteView,
 )
 
-from .models import Image
+from .models import Image, update_product_thumbnail
 from products.models import Product
 from .forms import (
     ImagesManagerForm,
@@ -35,6 +35,7 @@ class ImagesUpload(StaffPrivilegesRequiredMixin, FormView):
                     place=index
                     + len(images_queryset),  # set diplay position at the end of list
                 )
+            update_product_thumbnail(product)
         else:
             print(form.errors)
             # TODO handle error messages| form invalid here
@@ -58,10 +59,11 @@ class ImageDeleteView(StaffPrivilegesRequiredMixin, DeleteView):
         if product_pk is None:
             raise ValueError("product_pk can't be None value.")
 
-        images = Product.objects.get(pk=product_pk).images.all()
-        for index, image in enumerate(images):
+        product = Product.objects.get(pk=product_pk)
+        for index, image in enumerate(product.images.order_by("place")):
             image.place = index
             image.save()
+        update_product_thumbnail(product)
 
 
 class ImageManagerView(StaffPrivilegesRequiredMixin, FormView):
@@ -122,6 +124,7 @@ class ImageManagerView(StaffPrivilegesRequiredMixin, FormView):
                 )
                 next_image.save()
                 image.save()
+                update_product_thumbnail(Product.objects.get(pk=kwargs["pk"]))
         elif "move_down" in request.POST:
             # Changes image display position to lower.
             images = self.get_sorted_images(kwargs["pk"])
@@ -136,6 +139,7 @@ class ImageManagerView(StaffPrivilegesRequiredMixin, FormView):
                 )
                 previous_image.save()
                 image.save()
+                update_product_thumbnail(Product.objects.get(pk=kwargs["pk"]))
         elif "upload_images" in request.POST:
             # Uploading files using ImagesUploadView.
             ImagesUpload.as_view(
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class PagesConfig(AppConfig):
     name = 'pages'
+
+    def ready(self):
+        # Connect signal receivers.
+        from . import signals  # noqa: F401
@@ -0,0 +1,99 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+from products.cards import get_card_versions
+
+PAGE_VERSION_KEY = "pages:version"
+
+
+def new_version():
+    # Evicted counter starts over from fresh value, so stale pages saved under
+    # previous values are never reused.
+    return time.time_ns()
+
+
+def get_page_version():
+    version = cache.get(PAGE_VERSION_KEY)
+    if version is None:
+        # add doesn't override counter set in meantime by other process.
+        cache.add(PAGE_VERSION_KEY, new_version(), timeout=None)
+        version = cache.get(PAGE_VERSION_KEY)
+    return version
+
+
+def bump_page_version():
+    """Make every cached page stale. Pages showing product whose stock changed are
+    made stale by version of its card, see add_page_products."""
+    try:
+        cache.incr(PAGE_VERSION_KEY)
+    except ValueError:
+        # Key doesn't exist.
+        cache.add(PAGE_VERSION_KEY, new_version(), timeout=None)
+
+
+def page_key(request, version):
+    url = hashlib.md5(
+        (request.get_host() + request.get_full_path()).encode()
+    ).hexdigest()
+    return f"pages:page:{version}:{url}"
+
+
+def is_cacheable(request, response):
+    return (
+        response.status_code == 200
+        # Page doesn't contain CSRF token of user.
+        and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+        and not response.streaming
+        and not response.cookies
+        and not response.has_header("Cache-Control")
+    )
+
+
+def add_page_products(request, pks):
+    """Tell that shared page shows products with given pks. Cached page is stale
+    when card version of any of them changes, e.g. when its stock changes, so
+    shopping doesn't make every cached page stale."""
+    if getattr(request, "shared_page", False):
+        request.page_products.update(pks)
+
+
+def shared_page_cache(view):
+    """Cache GET responses of view, one copy shared by all users, until catalog
+    or shown products change, or PAGE_CACHE_TIMEOUT passes.
+
+    Page is rendered with request.shared_page set, so it skips per user parts of
+    templates. These are filled in by browser from UserNavView, see _base.html
+    and pages templatetags.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or not settings.PAGE_CACHE_TIMEOUT:
+            return view(request, *args, **kwargs)
+        key = page_key(request, get_page_version())
+        cached = cache.get(key)
+        if cached is not None:
+            response, versions = cached
+            if not versions or get_card_versions(versions) == versions:
+                return response
+
+        request.shared_page = True
+        request.page_products = set()
+        response = view(request, *args, **kwargs)
+
+        def store(response):
+            if is_cacheable(request, response):
+                versions = get_card_versions(request.page_products)
+                cache.set(key, (response, versions), settings.PAGE_CACHE_TIMEOUT)
+
+        if hasattr(response, "render") and not response.is_rendered:
+            response.add_post_render_callback(store)
+        else:
+            store(response)
+        return response
+
+    return wrapper
@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from categories.models import Category
+from images.models import Image
+from products.models import Product
+from reviews.models import Review
+
+from .cache import bump_page_version
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_pages(sender, **kwargs):
+    """Make cached pages stale, when anything shown on them changes. Pages are made
+    stale on commit, so they aren't rendered from data before the change and cached
+    as fresh in meantime."""
+    transaction.on_commit(bump_page_version)
+
+
+@receiver(m2m_changed, sender=Category.products.through)
+def invalidate_pages_on_categories_change(sender, action, **kwargs):
+    if action.startswith("post_"):
+        transaction.on_commit(bump_page_version)
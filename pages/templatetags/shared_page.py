@@ -0,0 +1,78 @@
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+ROLES = ("authenticated", "anonymous", "staff")
+
+
+def is_shared_page(context):
+    request = context.get("request")
+    return getattr(request, "shared_page", False)
+
+
+@register.simple_tag(takes_context=True)
+def page_csrf_token(context):
+    """csrf_token, left blank in shared pages and filled in by browser."""
+    token = "" if is_shared_page(context) else context.get("csrf_token", "")
+    return format_html(
+        '<input type="hidden" name="csrfmiddlewaretoken" value="{}">', token
+    )
+
+
+class PerUserNode(template.Node):
+    def __init__(self, nodelist, roles, user_pk):
+        self.nodelist = nodelist
+        self.roles = roles
+        self.user_pk = user_pk
+
+    def render(self, context):
+        user_pk = self.user_pk.resolve(context) if self.user_pk else None
+        if is_shared_page(context):
+            # Hidden until browser knows who is the user.
+            conditions = list(self.roles)
+            if user_pk is not None:
+                conditions.append(f"user:{user_pk}")
+            return format_html(
+                '<span data-user="{}" hidden>{}</span>',
+                " ".join(conditions),
+                self.nodelist.render(context),
+            )
+        user = context.get("user")
+        if user is None:
+            return ""
+        visible = (
+            ("authenticated" in self.roles and user.is_authenticated)
+            or ("anonymous" in self.roles and not user.is_authenticated)
+            or ("staff" in self.roles and user.is_authenticated and user.is_staff)
+            or (user_pk is not None and user.pk == user_pk)
+        )
+        return self.nodelist.render(context) if visible else ""
+
+
+@register.tag
+def peruser(parser, token):
+    """Render content only for some users, e.g.
+
+        {% peruser staff user=review.author.pk %}edit{% endperuser %}
+
+    shows content to staff and to review's author. Roles are authenticated,
+    anonymous and staff. In shared pages content is rendered for everyone, hidden
+    and shown by browser to matching users.
+    """
+    bits = token.split_contents()[1:]
+    roles = []
+    user_pk = None
+    for bit in bits:
+        if bit.startswith("user="):
+            user_pk = parser.compile_filter(bit[len("user=") :])
+        elif bit in ROLES:
+            roles.append(bit)
+        else:
+            raise template.TemplateSyntaxError(
+                f"peruser tag accepts {', '.join(ROLES)} roles and user=pk, "
+                f"not {bit}."
+            )
+    nodelist = parser.parse(("endperuser",))
+    parser.delete_first_token()
+    return PerUserNode(nodelist, roles, user_pk)
@@ -1,5 +1,11 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase, SimpleTestCase
 from django.urls import reverse, resolve
+from products.models import Product
+from products.stock import change_stock
+from reviews.models import Review
+from transactions.summary import invalidate_cart_summary
+from .cache import get_page_version
 from .views import HomePageView
 
 
@@ -29,3 +35,91 @@ class HomepageTests(SimpleTestCase):
             view.func.__name__,
             HomePageView.as_view().__name__,
         )
+
+
+class SharedPageCacheTest(TestCase):
+    def setUp(self):
+        # Cached pages are made stale on commit of changes.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                name="Hoe", producer="Universe", price=2500, count=10
+            )
+        self.user = get_user_model().objects.create_user(
+            username="pageuser", email="pageuser@email.com", password="testpass123"
+        )
+        # Cart summary of user with the same pk from other test.
+        invalidate_cart_summary(self.user.pk)
+
+    def test_page_shared_between_users(self):
+        url = reverse("product_details", kwargs={"pk": self.product.pk})
+        self.client.get(url)
+        self.client.force_login(self.user)
+        # Neither session, user nor product is loaded.
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, "Hoe")
+        self.assertContains(
+            response, '<input type="hidden" name="csrfmiddlewaretoken" value="">'
+        )
+        self.assertNotIn("csrftoken", response.cookies)
+        # User's navigation isn't rendered, it comes from user_nav.
+        self.assertNotContains(response, "Log Out")
+        self.assertContains(response, reverse("user_nav"))
+
+    def test_page_stale_on_review(self):
+        url = reverse("product_details", kwargs={"pk": self.product.pk})
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(
+                product=self.product, review="Sharp hoe.", author=self.user
+            )
+        response = self.client.get(url)
+        self.assertContains(response, "Sharp hoe.")
+        # Edit link is shown by browser to the author and staff only.
+        self.assertContains(
+            response, f'<span data-user="staff user:{self.user.pk}" hidden>'
+        )
+
+    def test_page_stale_on_product_change(self):
+        self.client.get(reverse("product_list"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.count = 7
+            self.product.save()
+        self.assertContains(self.client.get(reverse("product_list")), "7 left.")
+
+    def test_page_stale_on_stock_change_of_shown_product(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            rake = Product.objects.create(
+                name="Rake", producer="Universe", price=500, count=10
+            )
+        hoe_url = reverse("product_details", kwargs={"pk": self.product.pk})
+        rake_url = reverse("product_details", kwargs={"pk": rake.pk})
+        for url in (hoe_url, rake_url, reverse("product_list")):
+            self.client.get(url)
+        version = get_page_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            change_stock(self.product.pk, 3)
+        # Only pages showing the product are stale.
+        self.assertEqual(get_page_version(), version)
+        with self.assertNumQueries(0):
+            self.client.get(rake_url)
+        self.assertContains(self.client.get(hoe_url), "7 left.")
+        self.assertContains(self.client.get(reverse("product_list")), "7 left.")
+
+    def test_user_nav(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("user_nav"))
+        data = response.json()
+        self.assertTrue(data["csrf_token"])
+        self.assertIn("csrftoken", response.cookies)
+        self.assertIn("No products in cart.", data["html"])
+        self.assertEqual(
+            data["user"],
+            {"pk": self.user.pk, "is_authenticated": True, "is_staff": False},
+        )
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_user_nav_for_anonymous_user(self):
+        data = self.client.get(reverse("user_nav")).json()
+        self.assertIn("Log In", data["html"])
+        self.assertFalse(data["user"]["is_authenticated"])
@@ -1,4 +1,7 @@
 from django.urls import path
-from .views import HomePageView
+from .views import HomePageView, UserNavView
 
-urlpatterns = [path("", HomePageView.as_view(), name="home")]
+urlpatterns = [
+    path("", HomePageView.as_view(), name="home"),
+    path("user-nav/", UserNavView.as_view(), name="user_nav"),
+]
@@ -1,7 +1,34 @@
+from django.http import JsonResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import render
-
+from django.template.loader import render_to_string
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.cache import never_cache
 from django.views.generic import TemplateView
 
 
 class HomePageView(TemplateView):
     template_name = "home.html"
+
+
+@method_decorator(never_cache, name="dispatch")
+class UserNavView(View):
+    """Per user parts of pages cached for every user: navigation with cart, CSRF
+    token and user, which decides shown parts of page. See pages.cache."""
+
+    template_name = "user_nav.html"
+
+    def get(self, request, *args, **kwargs):
+        user = request.user
+        return JsonResponse(
+            {
+                "html": render_to_string(self.template_name, request=request),
+                "csrf_token": get_token(request),
+                "user": {
+                    "pk": user.pk,
+                    "is_authenticated": user.is_authenticated,
+                    "is_staff": user.is_staff,
+                },
+            }
+        )
@@ -0,0 +1,84 @@
+import threading
+from bisect import bisect_left
+
+from .cache import get_version
+from .models import Product
+from .search import normalize
+
+
+AUTOCOMPLETE_VERSION_KEY = "products:autocomplete:version"
+
+
+class PrefixIndex:
+    """Sorted array of normalized terms searched with bisect. Every term is also
+    stored from start of each of its words, so "uni" completes "Other Universe"."""
+
+    def __init__(self, terms):
+        entries = set()
+        for term in set(terms):
+            words = normalize(term).split()
+            for index in range(len(words)):
+                entries.add((" ".join(words[index:]), term))
+        entries = sorted(entries)
+        self.keys = [key for key, term in entries]
+        self.terms = [term for key, term in entries]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def complete(self, prefix, limit=10):
+        """Return up to limit terms with word starting with prefix."""
+        prefix = " ".join(normalize(prefix).split())
+        if not prefix:
+            return []
+
+        result = list()
+        index = bisect_left(self.keys, prefix)
+        while (
+            len(result) < limit
+            and index < len(self.keys)
+            and self.keys[index].startswith(prefix)
+        ):
+            if self.terms[index] not in result:
+                result.append(self.terms[index])
+            index += 1
+        return result
+
+
+class Autocomplete:
+    """Per process holder of product names and producers prefix indexes. Indexes
+    are rebuilt when version in cache, bumped on product changes, differs from
+    the one they were built for, so every worker sees catalog changes."""
+
+    fields = ("name", "producer")
+
+    def __init__(self):
+        self.version = None
+        self.indexes = dict()
+        self.lock = threading.Lock()
+
+    def get_indexes(self):
+        version = get_version(AUTOCOMPLETE_VERSION_KEY)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.indexes = self.build_indexes()
+                    self.version = version
+        return self.indexes
+
+    def build_indexes(self):
+        rows = list(Product.objects.values_list(*self.fields))
+        return {
+            field: PrefixIndex(row[position] for row in rows)
+            for position, field in enumerate(self.fields)
+        }
+
+    def complete(self, prefix, limit=10):
+        """Return dict of field's plural names and terms completing prefix."""
+        return {
+            f"{field}s": index.complete(prefix, limit)
+            for field, index in self.get_indexes().items()
+        }
+
+
+autocomplete = Autocomplete()
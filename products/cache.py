@@ -0,0 +1,32 @@
+from django.core.cache import cache
+
+
+def get_version(key):
+    """Return value of version counter stored in cache under key."""
+    version = cache.get(key)
+    if version is None:
+        # Counter evicted or never set. Start it over, add doesn't override
+        # value set in meantime by other process.
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+async def aget_version(key):
+    """Async get_version."""
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, 1, timeout=None)
+        version = await cache.aget(key, 1)
+    return version
+
+
+def bump_version(key):
+    """Increment version counter, making everything built for previous version
+    stale."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Key doesn't exist.
+        cache.add(key, 1, timeout=None)
+        return cache.get(key, 1)
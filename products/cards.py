@@ -0,0 +1,96 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = "product_card.html"
+HITS_KEY = "products:card:hits"
+MISSES_KEY = "products:card:misses"
+
+
+def card_version_key(pk):
+    return f"products:card:version:{pk}"
+
+
+def card_key(pk, version):
+    return f"products:card:{pk}:{version}"
+
+
+def new_version():
+    # Evicted counter starts over from fresh value, so stale fragments saved under
+    # previous values are never reused.
+    return time.time_ns()
+
+
+def bump_card_version(pk):
+    """Make cached card of product stale."""
+    key = card_version_key(pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Key doesn't exist.
+        cache.add(key, new_version(), timeout=None)
+
+
+def get_card_versions(pks):
+    """Return dict of products' pks and their cards' versions."""
+    keys = {card_version_key(pk): pk for pk in pks}
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # add doesn't override counter set in meantime by other process.
+        for key in missing:
+            cache.add(key, new_version(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def count(key, value):
+    if not value:
+        return
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, value)
+
+
+def card_cache_stats():
+    """Return numbers of cards served from cache and rendered."""
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {"hits": stats.get(HITS_KEY, 0), "misses": stats.get(MISSES_KEY, 0)}
+
+
+def reset_card_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+class ProductCards:
+    """Cards of listed products. Cached cards are fetched at once, missing ones
+    are rendered and cached on first use. Cards don't include per user parts, like
+    add to cart form with CSRF token."""
+
+    def __init__(self, products):
+        self.versions = get_card_versions([product.pk for product in products])
+        keys = {card_key(pk, version): pk for pk, version in self.versions.items()}
+        self.cards = {
+            keys[key]: card for key, card in cache.get_many(list(keys)).items()
+        }
+        count(HITS_KEY, len(self.cards))
+
+    def render(self, product):
+        card = self.cards.get(product.pk)
+        if card is None:
+            if product.pk not in self.versions:
+                self.versions.update(get_card_versions([product.pk]))
+            card = render_to_string(CARD_TEMPLATE, {"product": product})
+            cache.set(
+                card_key(product.pk, self.versions[product.pk]),
+                card,
+                settings.PRODUCT_CARD_CACHE_TIMEOUT,
+            )
+            self.cards[product.pk] = card
+            count(MISSES_KEY, 1)
+        return mark_safe(card)
@@ -0,0 +1,182 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from django.utils.http import urlencode
+
+from categories.models import Category
+from .cache import get_version
+from .search import CATALOG_VERSION_KEY
+
+
+class Facets:
+    """Facet counts of products queryset per category, producer and price bucket,
+    and narrowing the queryset down to selected facets. Each facet is counted with
+    one grouped query, with selections of other facets applied, so alternatives
+    within facet stay visible. Selected facets come from GET parameters named as
+    facets."""
+
+    fields = ("category", "producer", "price")
+    # Bounds of price buckets, in lowest change of currency.
+    price_bounds = (0, 1000, 5000, 10000, 50000)
+    # Maximal number of producers listed.
+    producers_limit = 20
+
+    def __init__(self, queryset, params, scope):
+        """scope identifies queryset in cache keys, e.g. search phrase."""
+        self.queryset = queryset
+        self.scope = scope
+        self.selected = self.parse(params)
+
+    def parse(self, params):
+        selected = {field: list() for field in self.fields}
+        for value in params.getlist("category"):
+            if value.isdigit():
+                selected["category"].append(int(value))
+        selected["producer"] = params.getlist("producer")
+        buckets = dict(self.price_buckets())
+        selected["price"] = [key for key in params.getlist("price") if key in buckets]
+        return selected
+
+    def is_selected(self):
+        return any(self.selected.values())
+
+    def query_string(self):
+        """Return selected facets as URL query string, e.g. for pagination links."""
+        return urlencode(
+            [(field, value) for field in self.fields for value in self.selected[field]]
+        )
+
+    def price_buckets(self):
+        """Return list of (key, (lower bound, upper bound)) of price buckets, last
+        upper bound is None."""
+        bounds = list(self.price_bounds) + [None]
+        return [
+            (f"{lower}-{upper if upper is not None else ''}", (lower, upper))
+            for lower, upper in zip(bounds, bounds[1:])
+        ]
+
+    def filter(self, queryset=None, exclude=None):
+        """Return queryset narrowed to selected facets, except exclude facet."""
+        if queryset is None:
+            queryset = self.queryset
+
+        if self.selected["category"] and exclude != "category":
+            # Subquery on m2m table doesn't duplicate products, like join would.
+            queryset = queryset.filter(
+                pk__in=Category.products.through.objects.filter(
+                    category__in=self.selected["category"]
+                ).values("product")
+            )
+        if self.selected["producer"] and exclude != "producer":
+            queryset = queryset.filter(producer__in=self.selected["producer"])
+        if self.selected["price"] and exclude != "price":
+            buckets = dict(self.price_buckets())
+            condition = Q()
+            for key in self.selected["price"]:
+                lower, upper = buckets[key]
+                bucket = Q(price__gte=lower)
+                if upper is not None:
+                    bucket &= Q(price__lt=upper)
+                condition |= bucket
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def count_categories(self):
+        queryset = self.filter(exclude="category")
+        return [
+            {
+                "value": pk,
+                "label": name,
+                "count": count,
+                "selected": pk in self.selected["category"],
+            }
+            for pk, name, count in Category.objects.filter(
+                products__in=queryset.values("pk")
+            )
+            .annotate(count=Count("products"))
+            .order_by("name")
+            .values_list("pk", "name", "count")
+        ]
+
+    def count_producers(self):
+        queryset = self.filter(exclude="producer")
+        return [
+            {
+                "value": producer,
+                "label": producer,
+                "count": count,
+                "selected": producer in self.selected["producer"],
+            }
+            for producer, count in queryset.order_by()
+            .values("producer")
+            .annotate(count=Count("pk"))
+            .order_by("-count", "producer")
+            .values_list("producer", "count")[: self.producers_limit]
+        ]
+
+    def count_prices(self):
+        queryset = self.filter(exclude="price")
+        buckets = self.price_buckets()
+        bucket = Case(
+            *[
+                When(price__lt=upper, then=Value(index))
+                for index, (key, (lower, upper)) in enumerate(buckets[:-1])
+            ],
+            default=Value(len(buckets) - 1),
+            output_field=IntegerField(),
+        )
+        counts = dict(
+            queryset.order_by()
+            .annotate(bucket=bucket)
+            .values("bucket")
+            .annotate(count=Count("pk"))
+            .values_list("bucket", "count")
+        )
+        return [
+            {
+                "value": key,
+                "lower": lower,
+                "upper": upper,
+                "count": counts[index],
+                "selected": key in self.selected["price"],
+            }
+            for index, (key, (lower, upper)) in enumerate(buckets)
+            if index in counts
+        ]
+
+    def cache_key(self, suffix):
+        selected = json.dumps(self.selected, sort_keys=True)
+        digest = hashlib.md5(f"{self.scope}:{selected}".encode()).hexdigest()
+        version = get_version(CATALOG_VERSION_KEY)
+        return f"products:facets:{version}:{digest}:{suffix}"
+
+    def get_counts(self):
+        """Return dict of facet names and lists of facet values with counts. Cached
+        until catalog version changes."""
+        key = self.cache_key("counts")
+        counts = cache.get(key)
+        if counts is None:
+            counts = {
+                "category": self.count_categories(),
+                "producer": self.count_producers(),
+                "price": self.count_prices(),
+            }
+            cache.set(key, counts, settings.SEARCH_CACHE_TIMEOUT)
+        return counts
+
+    def narrow(self, results):
+        """Return list of (pk, rank) search results narrowed to selected facets,
+        order is kept. Cached until catalog version changes."""
+        if not self.is_selected():
+            return results
+
+        key = self.cache_key("pks")
+        pks = cache.get(key)
+        if pks is None:
+            pks = [str(pk) for pk in self.filter().values_list("pk", flat=True)]
+            cache.set(key, pks, settings.SEARCH_CACHE_TIMEOUT)
+        pks = set(pks)
+        return [(pk, rank) for pk, rank in results if pk in pks]
@@ -0,0 +1,174 @@
+import random
+import statistics
+import time
+from uuid import UUID
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from products.cache import bump_version
+from products.models import Product
+from products.search import (
+    CATALOG_VERSION_KEY,
+    SEARCH_BACKENDS,
+    get_search_backend,
+    index_products,
+)
+from products.views import SearchResultView
+
+
+ADJECTIVES = (
+    "garden", "steel", "electric", "compact", "heavy", "light", "cordless",
+    "folding", "classic", "professional", "mini", "wooden", "stainless",
+    "portable", "wireless", "ergonomic", "outdoor", "premium", "budget", "smart",
+)
+NOUNS = (
+    "hoe", "rake", "scythe", "spade", "shovel", "mower", "trimmer", "saw",
+    "drill", "hammer", "wrench", "ladder", "hose", "sprinkler", "pruner", "axe",
+    "chisel", "sander", "grinder", "blower", "vacuum", "lamp", "bench", "toolbox",
+)
+PRODUCERS = (
+    "Universe", "Sztil", "Hortex", "Gardena", "Fiskars", "Bosch", "Makita",
+    "Husqvarna", "Stanley", "Dewalt", "Ryobi", "Einhell", "Karcher", "Wolf",
+    "Greenworks", "Black Decker", "Metabo", "Hitachi", "Festool", "Milwaukee",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark search backends on synthetic catalogs. Reports p50 and p95 "
+        "latency, queries per search and recall@10 against golden set. Catalog is "
+        "created in transaction, that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[10000, 100000, 1000000],
+            help="Numbers of products in synthetic catalogs.",
+        )
+        parser.add_argument(
+            "--backends",
+            nargs="+",
+            default=["view"] + list(SEARCH_BACKENDS),
+            choices=["view"] + list(SEARCH_BACKENDS),
+            help=(
+                "Search backends to benchmark. 'view' is SearchResultView.search, "
+                "configured backend with results cache."
+            ),
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Number of times every query is run.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat has to be positive.")
+
+        for size in options["sizes"]:
+            try:
+                with transaction.atomic():
+                    self.stdout.write(f"Catalog of {size} products:")
+                    self.create_catalog(size, random.Random(options["seed"]))
+                    queries = self.get_golden_set(random.Random(options["seed"]))
+                    for backend_name in options["backends"]:
+                        self.stdout.write(
+                            self.format_report(
+                                backend_name,
+                                self.benchmark(
+                                    backend_name, queries, options["repeat"]
+                                ),
+                            )
+                        )
+                    transaction.set_rollback(True)
+            finally:
+                # Cache isn't rolled back, results cached for synthetic catalog
+                # would be served to real searches.
+                bump_version(CATALOG_VERSION_KEY)
+
+    def create_catalog(self, size, generator):
+        """Create products with names of adjective and noun, and producers in Zipf
+        like distribution, so some of them are much more popular."""
+        producer_weights = [1 / rank for rank in range(1, len(PRODUCERS) + 1)]
+        batch = list()
+        for index in range(size):
+            batch.append(
+                Product(
+                    name=(
+                        f"{generator.choice(ADJECTIVES).capitalize()} "
+                        f"{generator.choice(NOUNS)} {index}"
+                    ),
+                    producer=generator.choices(PRODUCERS, producer_weights)[0],
+                    description="",
+                    price=generator.randint(100, 100000),
+                    count=generator.randint(0, 1000),
+                )
+            )
+            if len(batch) == 10000:
+                Product.objects.bulk_create(batch)
+                batch = list()
+        Product.objects.bulk_create(batch)
+        index_products(Product.objects.all())
+        # Bulk create doesn't send signals, make cached results stale by hand.
+        bump_version(CATALOG_VERSION_KEY)
+
+    def get_golden_set(self, generator):
+        """Return list of (query, relevant product pks). Product is relevant if it
+        contains every word of query."""
+        queries = [f"{generator.choice(ADJECTIVES)} {generator.choice(NOUNS)}"]
+        queries += [generator.choice(NOUNS) for _ in range(3)]
+        queries += [
+            f"{generator.choice(NOUNS)} {generator.choice(PRODUCERS[-5:]).lower()}"
+        ]
+        golden_set = list()
+        for query in queries:
+            queryset = Product.objects.all()
+            for word in query.split():
+                queryset = queryset.filter(name__icontains=word) | queryset.filter(
+                    producer__icontains=word
+                )
+            golden_set.append((query, set(queryset.values_list("pk", flat=True))))
+        return golden_set
+
+    def benchmark(self, backend_name, golden_set, repeat):
+        """Return latencies in milliseconds, queries counts and recalls@10."""
+        latencies, queries_counts, recalls = list(), list(), list()
+        for query, relevant in golden_set:
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    results = self.search(backend_name, query)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                queries_counts.append(len(context.captured_queries))
+
+            found = set(results) & relevant
+            recalls.append(len(found) / min(10, len(relevant)) if relevant else 1.0)
+        return latencies, queries_counts, recalls
+
+    def search(self, backend_name, query):
+        """Return pks of top 10 products found by backend."""
+        if backend_name == "view":
+            results = SearchResultView().search(query)[:10]
+            return [UUID(pk) for pk, rank in results]
+        results = get_search_backend(backend_name).results(query, 10)
+        return [pk for pk, rank in results]
+
+    def format_report(self, backend_name, results):
+        latencies, queries_counts, recalls = results
+        if len(latencies) > 1:
+            percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+            p50, p95 = percentiles[49], percentiles[94]
+        else:
+            p50 = p95 = latencies[0]
+        return (
+            f"  {backend_name:<10} p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  "
+            f"queries {statistics.mean(queries_counts):4.1f}  "
+            f"recall@10 {statistics.mean(recalls):.2f}"
+        )
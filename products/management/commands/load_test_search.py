@@ -0,0 +1,119 @@
+import itertools
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+PHRASES = (
+    "hoe", "garden rake", "scythe", "electric mower", "steel spade", "universe",
+    "cordless drill", "wooden ladder", "hose", "portable lamp",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test running servers with concurrent search requests. Reports "
+        "throughput and p50, p95 latency for every target and concurrency, e.g. "
+        "to compare gunicorn sync workers serving SearchResultView with uvicorn "
+        "workers serving AsyncSearchResultView."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--targets",
+            nargs="+",
+            default=[
+                "wsgi=http://localhost:8000/products/search/",
+                "asgi=http://localhost:8001/products/search/async/",
+            ],
+            help="Search urls to test, in name=url format.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            nargs="+",
+            type=int,
+            default=[1, 8, 32],
+            help="Numbers of requests sent at once.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Number of requests sent for every target and concurrency.",
+        )
+        parser.add_argument(
+            "--phrases",
+            nargs="+",
+            default=PHRASES,
+            help="Searched phrases, used in turns.",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=30.0,
+            help="Seconds to wait for response.",
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or min(options["concurrency"]) < 1:
+            raise CommandError("--requests and --concurrency have to be positive.")
+        targets = list()
+        for target in options["targets"]:
+            name, separator, url = target.partition("=")
+            if not separator:
+                raise CommandError(f"Target {target} is not in name=url format.")
+            targets.append((name, url))
+
+        for concurrency in options["concurrency"]:
+            self.stdout.write(f"Concurrency {concurrency}:")
+            for name, url in targets:
+                urls = [
+                    f"{url}?{urlencode({'phrase': phrase})}"
+                    for phrase in itertools.islice(
+                        itertools.cycle(options["phrases"]), options["requests"]
+                    )
+                ]
+                self.stdout.write(
+                    self.format_report(
+                        name, self.load_test(urls, concurrency, options["timeout"])
+                    )
+                )
+
+    def load_test(self, urls, concurrency, timeout):
+        """Return total time in seconds, latencies in milliseconds of successful
+        requests and number of failed ones."""
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            start = time.perf_counter()
+            results = list(executor.map(lambda url: self.request(url, timeout), urls))
+            total = time.perf_counter() - start
+        latencies = [latency for latency in results if latency is not None]
+        return total, latencies, len(results) - len(latencies)
+
+    def request(self, url, timeout):
+        """Return latency of request in milliseconds, or None if it failed."""
+        start = time.perf_counter()
+        try:
+            with urlopen(url, timeout=timeout) as response:
+                response.read()
+        except (URLError, OSError):
+            return None
+        return (time.perf_counter() - start) * 1000
+
+    def format_report(self, name, results):
+        total, latencies, errors = results
+        if not latencies:
+            return f"  {name:<10} all {errors} requests failed"
+        if len(latencies) > 1:
+            percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+            p50, p95 = percentiles[49], percentiles[94]
+        else:
+            p50 = p95 = latencies[0]
+        return (
+            f"  {name:<10} {len(latencies) / total:8.1f} req/s  "
+            f"p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  errors {errors}"
+        )
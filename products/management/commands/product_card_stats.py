@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from products.cards import card_cache_stats, reset_card_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show numbers of product cards served from cache and rendered."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset counters after showing them.",
+        )
+
+    def handle(self, *args, **options):
+        stats = card_cache_stats()
+        served = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / served if served else 0.0
+        self.stdout.write(
+            f"hits {stats['hits']}  misses {stats['misses']}  hit ratio {ratio:.2f}"
+        )
+        if options["reset"]:
+            reset_card_cache_stats()
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+
+from products.cache import bump_version
+from products.models import Product, SearchIndexTask
+from products.search import CATALOG_VERSION_KEY, index_products
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild search postings and full text search documents of all products, "
+        "e.g. after change of indexed fields or their weights."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of products indexed at once.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size has to be positive.")
+
+        # Tasks queued before rebuild are done by it, later ones may be not.
+        last_task = SearchIndexTask.objects.aggregate(last=Max("pk"))["last"]
+        index_products(Product.objects.order_by("pk"), options["batch_size"])
+        if last_task is not None:
+            SearchIndexTask.objects.filter(pk__lte=last_task).delete()
+        bump_version(CATALOG_VERSION_KEY)
+        self.stdout.write(f"Indexed {Product.objects.count()} products.")
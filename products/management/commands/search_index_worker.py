@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections
+
+from products.search import process_index_queue
+
+
+class Command(BaseCommand):
+    help = (
+        "Index long product fields and full text search documents of products "
+        "queued on save. Many workers can run at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of queued tasks processed in one transaction.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when queue is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when queue is empty, instead of waiting for new tasks.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size has to be positive.")
+
+        processed = 0
+        while True:
+            try:
+                count = process_index_queue(options["batch_size"])
+            except DatabaseError as error:
+                if options["once"]:
+                    raise CommandError(f"Indexing failed: {error}")
+                # Batch is rolled back and its tasks are retried, worker keeps
+                # running.
+                self.stderr.write(f"Indexing failed: {error}")
+                close_old_connections()
+                time.sleep(options["interval"])
+                continue
+            processed += count
+            if count:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(f"Processed {processed} tasks.")
@@ -0,0 +1,59 @@
+# Generated by Django 4.0.10 on 2026-10-18 18:26
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Tokenizer and field weights as they were when the index was created. Copied
+# from products.search, so later changes of search don't change this migration.
+TOKEN_PATTERN = re.compile(r"\w+")
+TOKEN_MAX_LENGTH = 64
+FIELDS = {"name": 1.0, "producer": 1.2}
+
+
+def tokenize(text):
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [token[:TOKEN_MAX_LENGTH] for token in TOKEN_PATTERN.findall(text)]
+
+
+def index_products(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    SearchPosting = apps.get_model("products", "SearchPosting")
+    postings = list()
+    for product in Product.objects.all().iterator():
+        for field, weight in FIELDS.items():
+            for token in set(tokenize(getattr(product, field))):
+                postings.append(
+                    SearchPosting(
+                        product=product, token=token, field=field, weight=weight
+                    )
+                )
+    SearchPosting.objects.bulk_create(postings, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_delete_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('field', models.CharField(max_length=32)),
+                ('weight', models.FloatField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='products.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchposting',
+            constraint=models.UniqueConstraint(fields=('token', 'product', 'field'), name='unique_search_posting'),
+        ),
+        migrations.RunPython(index_products, migrations.RunPython.noop),
+    ]
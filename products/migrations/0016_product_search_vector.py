@@ -0,0 +1,59 @@
+# Generated by Django 4.0.10 on 2026-10-18 18:28
+
+import operator
+from functools import reduce
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+# Fields of full text search document and their weight labels, as they were when
+# the document was added. Copied from products.search, so later changes of search
+# don't change this migration.
+VECTOR_FIELDS = {"producer": "A", "name": "B", "description": "C"}
+
+
+def search_vector():
+    config = settings.SEARCH_FULLTEXT_CONFIG
+    return reduce(
+        operator.add,
+        [
+            SearchVector(field, weight=weight, config=config)
+            for field, weight in VECTOR_FIELDS.items()
+        ],
+    )
+
+
+def create_search_vector_index(apps, schema_editor):
+    # GIN indexes and text search documents are PostgreSQL only.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX product_search_vector_idx ON products_product "
+        "USING GIN (search_vector)"
+    )
+    Product = apps.get_model("products", "Product")
+    Product.objects.update(search_vector=search_vector())
+
+
+def drop_search_vector_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS product_search_vector_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_searchposting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_vector_index, drop_search_vector_index),
+    ]
@@ -0,0 +1,32 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # pg_trgm GIN indexes are PostgreSQL only.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for field in ("name", "producer"):
+        schema_editor.execute(
+            f"CREATE INDEX product_{field}_trgm_idx ON products_product "
+            f"USING GIN ({field} gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for field in ("name", "producer"):
+        schema_editor.execute(f"DROP INDEX IF EXISTS product_{field}_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0016_product_search_vector"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
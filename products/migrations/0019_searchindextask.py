@@ -0,0 +1,22 @@
+# Generated by Django 4.0.10 on 2026-10-18 18:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0018_product_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_index_tasks', to='products.product')),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.13 on 2026-10-18 19:45
+
+from django.db import migrations
+
+
+def queue_products(apps, schema_editor):
+    """Descriptions are indexed by search_index_worker, queue existing products,
+    which were indexed by name and producer only."""
+    Product = apps.get_model("products", "Product")
+    SearchIndexTask = apps.get_model("products", "SearchIndexTask")
+    tasks = (
+        SearchIndexTask(product_id=pk)
+        for pk in Product.objects.values_list("pk", flat=True).iterator()
+    )
+    SearchIndexTask.objects.bulk_create(tasks, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0021_product_thumbnail'),
+    ]
+
+    operations = [
+        migrations.RunPython(queue_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.13 on 2026-10-18 19:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0022_queue_description_indexing"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="searchposting",
+            index=models.Index(
+                fields=["token"],
+                name="searchposting_token_like_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.urls import reverse
 import uuid
@@ -14,6 +15,25 @@ class Product(models.Model):
     description = models.CharField(max_length=3000)
     price = models.IntegerField()  # price in lowest change of currency
     count = models.IntegerField()  # products in stock
+    # Weighted full text search document, used by FullTextSearchBackend. Filled on
+    # PostgreSQL only, GIN index is created in migration.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Copy of first image's path and dimensions, so listings don't query images.
+    # Kept in sync by images app, see images.models.update_product_thumbnail.
+    thumbnail = models.ImageField(
+        upload_to="product_images/", blank=True, editable=False
+    )
+    thumbnail_width = models.PositiveIntegerField(null=True, editable=False)
+    thumbnail_height = models.PositiveIntegerField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Facet filters.
+            models.Index(fields=["producer"], name="product_producer_idx"),
+            models.Index(fields=["price"], name="product_price_idx"),
+            # Cursor pagination of product list.
+            models.Index(fields=["name", "id"], name="product_name_id_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -22,5 +42,51 @@ class Product(models.Model):
         return reverse("product_details", kwargs={"pk": self.pk})
 
 
+class SearchPosting(models.Model):
+    """Inverted index entry. Tells that token occurs in product's field, weight is
+    the field's priority rate in search ranking."""
+
+    token = models.CharField(max_length=64)
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="postings",
+    )
+    field = models.CharField(max_length=32)
+    weight = models.FloatField()
+
+    class Meta:
+        constraints = [
+            # Also serves as index for token lookups.
+            models.UniqueConstraint(
+                fields=["token", "product", "field"],
+                name="unique_search_posting",
+            )
+        ]
+        indexes = [
+            # Prefix lookups (LIKE 'token%') on PostgreSQL with non C collation.
+            models.Index(
+                fields=["token"],
+                name="searchposting_token_like_idx",
+                opclasses=["varchar_pattern_ops"],
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.token} - {self.field}"
+
+
+class SearchIndexTask(models.Model):
+    """Queued product, which long fields and full text search document have to be
+    indexed by search index worker."""
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="search_index_tasks",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
 def get_product_model():
     return Product
@@ -0,0 +1,198 @@
+from bisect import bisect_left, bisect_right
+
+from django.core import signing
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Q
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPage:
+    """Page of CursorPaginator. Cursors are None if there is no next or previous
+    page."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator:
+    """Keyset paginator. Instead of OFFSET, page is filtered to items placed after
+    the cursor, which holds ordering values of previous page's edge item, so every
+    page costs the same single query and doesn't need COUNT(*). Ordering fields
+    have to make order unique, e.g. end with pk."""
+
+    salt = "products.pagination.cursor"
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+
+    def page(self, cursor=None):
+        """Return page following cursor, or the first page if cursor is None."""
+        values, backwards = None, False
+        if cursor:
+            values, backwards = self.decode_cursor(cursor)
+
+        # One more item tells if there is anything past this page.
+        object_list = self.get_items(values, backwards, self.per_page + 1)
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[: self.per_page]
+        if backwards:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        if not object_list:
+            return CursorPage(object_list)
+        return CursorPage(
+            object_list,
+            next_cursor=self.encode_cursor(object_list[-1]) if has_next else None,
+            previous_cursor=(
+                self.encode_cursor(object_list[0], backwards=True)
+                if has_previous
+                else None
+            ),
+        )
+
+    def get_items(self, values, backwards, limit):
+        """Return up to limit items placed after values, in reversed ordering if
+        backwards."""
+        ordering = self.reverse_ordering() if backwards else self.ordering
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.keyset_filter(ordering, values))
+        return list(queryset[:limit])
+
+    def reverse_ordering(self):
+        return tuple(
+            field[1:] if field.startswith("-") else f"-{field}"
+            for field in self.ordering
+        )
+
+    def keyset_filter(self, ordering, values):
+        """Return condition of items placed after values in ordering."""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def encode_cursor(self, item, backwards=False):
+        values = list()
+        for field in self.ordering:
+            value = getattr(item, field.lstrip("-"))
+            if not isinstance(value, (int, float, str)):
+                value = str(value)
+            values.append(value)
+        return signing.dumps([values, backwards], salt=self.salt, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            values, backwards = signing.loads(cursor, salt=self.salt)
+        except (signing.BadSignature, ValueError, TypeError):
+            raise InvalidCursor("Invalid cursor.")
+        if len(values) != len(self.ordering):
+            raise InvalidCursor("Invalid cursor.")
+        return values, backwards
+
+
+class RankedListPaginator(CursorPaginator):
+    """Cursor paginator over list of (pk, rank) pairs, e.g. cached search results,
+    sorted by rank descending and pk. Page's products are fetched from queryset
+    with one query and get the 'rank' attribute."""
+
+    def __init__(self, results, queryset, per_page):
+        super().__init__(queryset, per_page, ordering=("-rank", "pk"))
+        self.results = results
+        self.keys = [(-rank, pk) for pk, rank in results]
+
+    def get_items(self, values, backwards, limit):
+        if values is None:
+            window = self.results[:limit]
+        else:
+            rank, pk = values
+            if backwards:
+                end = bisect_left(self.keys, (-rank, pk))
+                window = self.results[max(end - limit, 0) : end][::-1]
+            else:
+                start = bisect_right(self.keys, (-rank, pk))
+                window = self.results[start : start + limit]
+
+        products = {
+            str(product.pk): product
+            for product in self.queryset.filter(pk__in=[pk for pk, rank in window])
+        }
+        items = list()
+        for pk, rank in window:
+            # Product could be deleted since results were listed.
+            if pk in products:
+                products[pk].rank = rank
+                items.append(products[pk])
+        return items
+
+
+class RowPaginator(Paginator):
+    """Paginator of grid with rows_count items in row, per_page is number of rows.
+    Page's items are sliced from object_list in database, and only they are split
+    to rows with split function."""
+
+    def __init__(self, object_list, per_page, rows_count, split=None, **kwargs):
+        self.rows_count = rows_count
+        self.split = split or split_to_rows
+        super().__init__(object_list, per_page * rows_count, **kwargs)
+
+    def _get_page(self, object_list, number, paginator):
+        return super()._get_page(
+            self.split(object_list, self.rows_count), number, paginator
+        )
+
+
+def split_items_to_rows(items, rows_count, blank="blank"):
+    """Split items to rows of rows_count length. Last row is filled up with blank
+    items."""
+    rows = list()
+    row = list()
+    for item in items:
+        row.append(item)
+        if len(row) == rows_count:
+            rows.append(row)
+            row = list()
+
+    if row:
+        row.extend(blank for _ in range(rows_count - len(row)))
+        rows.append(row)
+    return rows
+
+
+def split_to_rows(products, rows_count):
+    """Split products to rows of (product, thumbnail) tuples for grid templates.
+    Last row is filled up with blank items to the same length."""
+    items = (
+        (product, product.thumbnail if product.thumbnail else "no thumbnail")
+        for product in products
+    )
+    return split_items_to_rows(items, rows_count, blank=("blank", "no thumbnail"))
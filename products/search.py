@@ -0,0 +1,507 @@
+import hashlib
+import operator
+import re
+import unicodedata
+from contextlib import contextmanager
+from functools import reduce
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    SearchVectorField,
+    TrigramWordSimilarity,
+)
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, Func, Max, Q, Value, When
+from django.db.models.expressions import CombinedExpression
+from django.db.models.functions import Cast, Coalesce
+
+from .cache import aget_version, bump_version, get_version
+from .models import Product, SearchIndexTask, SearchPosting
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Version counter bumped on every product change, e.g. to make cached search
+# results stale.
+CATALOG_VERSION_KEY = "products:catalog:version"
+
+
+def normalize(text):
+    """Lowercase text and strip accents, so "Łódź" and "lodz" are the same."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    """Split text into normalized tokens, truncated to posting's token length."""
+    max_length = SearchPosting._meta.get_field("token").max_length
+    return [token[:max_length] for token in TOKEN_PATTERN.findall(normalize(text))]
+
+
+def trigrams(text):
+    """Return set of trigrams of text's words, padded the same way as PostgreSQL's
+    pg_trgm does it."""
+    result = set()
+    for word in tokenize(text):
+        padded = f"  {word} "
+        result.update(padded[index : index + 3] for index in range(len(padded) - 2))
+    return result
+
+
+def trigram_similarity(a, b):
+    """Return similarity of texts a and b, ratio of shared trigrams to all of them."""
+    trigrams_a, trigrams_b = trigrams(a), trigrams(b)
+    if not trigrams_a or not trigrams_b:
+        return 0.0
+    return len(trigrams_a & trigrams_b) / len(trigrams_a | trigrams_b)
+
+
+def trigram_word_similarity(word, text):
+    """Return greatest similarity between word and words of text."""
+    return max((trigram_similarity(word, token) for token in tokenize(text)), default=0.0)
+
+
+def build_postings(product, fields):
+    """Return list of unsaved search postings of product's fields, fields is dict
+    of field names and weights."""
+    postings = list()
+    for field, weight in fields.items():
+        for token in set(tokenize(getattr(product, field))):
+            postings.append(
+                SearchPosting(product=product, token=token, field=field, weight=weight)
+            )
+    return postings
+
+
+def index_product(product):
+    """Replace search postings of product's fields indexed on save."""
+    with transaction.atomic():
+        # Concurrent saves and search index worker index product one at a time.
+        Product.objects.select_for_update().filter(pk=product.pk).exists()
+        SearchPosting.objects.filter(
+            product=product, field__in=SearchBackend.fields
+        ).delete()
+        SearchPosting.objects.bulk_create(
+            build_postings(product, SearchBackend.fields), ignore_conflicts=True
+        )
+        if connection.vendor == "postgresql":
+            # Part of full text search document of background fields is written by
+            # search index worker, the rest is kept up to date on save.
+            Product.objects.filter(pk=product.pk).update(
+                search_vector=CombinedExpression(
+                    search_vector(SearchBackend.fields),
+                    "||",
+                    stored_search_vector(SearchBackend.background_fields),
+                    output_field=SearchVectorField(),
+                )
+            )
+
+
+def index_products(queryset, batch_size=1000):
+    """Replace every search posting and full text search document of products in
+    queryset, batch_size products at once."""
+    fields = {**SearchBackend.fields, **SearchBackend.background_fields}
+    batch = list()
+    for product in queryset.iterator(chunk_size=batch_size):
+        batch.append(product)
+        if len(batch) == batch_size:
+            _index_batch(batch, fields)
+            batch = list()
+    if batch:
+        _index_batch(batch, fields)
+
+
+def _index_batch(products, fields):
+    SearchPosting.objects.filter(product__in=products, field__in=fields).delete()
+    # Postings inserted in meantime by indexing of the same product, e.g. by
+    # rebuild_search_index, don't fail whole batch.
+    SearchPosting.objects.bulk_create(
+        [posting for product in products for posting in build_postings(product, fields)],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    if connection.vendor == "postgresql":
+        Product.objects.filter(pk__in=[product.pk for product in products]).update(
+            search_vector=search_vector()
+        )
+
+
+def enqueue_indexing(product):
+    """Queue product for search index worker, unless it's queued already."""
+    with transaction.atomic():
+        # Task locked by worker doesn't count, worker could read product before
+        # this change.
+        queued = (
+            SearchIndexTask.objects.filter(product=product)
+            .select_for_update(skip_locked=True)
+            .exists()
+        )
+        if not queued:
+            SearchIndexTask.objects.create(product=product)
+
+
+def process_index_queue(batch_size=100):
+    """Index background fields and full text search documents of products from
+    batch_size oldest tasks in queue. Return number of processed tasks."""
+    with transaction.atomic():
+        # Locked tasks are processed by other worker.
+        tasks = list(
+            SearchIndexTask.objects.select_for_update(skip_locked=True).order_by("pk")[
+                :batch_size
+            ]
+        )
+        if not tasks:
+            return 0
+        # Product locked by other worker, through its other task, or by save is
+        # indexed by it. Its tasks here are left in queue.
+        products = list(
+            Product.objects.filter(
+                pk__in={task.product_id for task in tasks}
+            ).select_for_update(skip_locked=True)
+        )
+        _index_batch(products, SearchBackend.background_fields)
+        indexed = {product.pk for product in products}
+        processed = [task.pk for task in tasks if task.product_id in indexed]
+        # Product saved in meantime has new task, so it's indexed again later.
+        SearchIndexTask.objects.filter(pk__in=processed).delete()
+    # Cached search results don't include newly indexed fields.
+    bump_version(CATALOG_VERSION_KEY)
+    return len(processed)
+
+
+def search_vector(fields=None):
+    """Return expression of product's weighted full text search document of
+    fields, all of them by default."""
+    config = settings.SEARCH_FULLTEXT_CONFIG
+    vectors = [
+        SearchVector(field, weight=weight, config=config)
+        for field, weight in FullTextSearchBackend.vector_fields.items()
+        if fields is None or field in fields
+    ]
+    return reduce(operator.add, vectors)
+
+
+def stored_search_vector(fields):
+    """Return expression of fields' part of stored full text search document, found
+    by their weight labels."""
+    labels = [
+        weight.lower()
+        for field, weight in FullTextSearchBackend.vector_fields.items()
+        if field in fields
+    ]
+    return Func(
+        Coalesce(F("search_vector"), Cast(Value(""), SearchVectorField())),
+        Value("{" + ",".join(labels) + "}"),
+        function="ts_filter",
+        output_field=SearchVectorField(),
+    )
+
+
+class SearchBackend:
+    """Base class for search backends. Backend's search method returns products
+    queryset annotated with 'rank' and ordered by it, best match first."""
+
+    # Field names to search in and their priority rates. Rank of product is sum
+    # of priority rates of fields matched by words of the phrase.
+    fields = {"name": 1.0, "producer": 1.2}
+    # Long fields, indexed by search index worker instead of on save. Searched only
+    # by backends using the index.
+    background_fields = {"description": 0.4}
+    # pk makes order of products with equal rank stable, e.g. for pagination.
+    ordering = ("-rank", "pk")
+
+    def search(self, phrase):
+        raise NotImplementedError("Search backend have to implement search method.")
+
+    def results(self, phrase, limit):
+        """Return list of (pk, rank) pairs of limit best matches of phrase."""
+        return list(self.search(phrase).values_list("pk", "rank")[:limit])
+
+    async def aresults(self, phrase, limit):
+        """Async results, query is run by async ORM."""
+        # Backends may run queries while building queryset, e.g. python fallback
+        # of trigram backend.
+        queryset = await sync_to_async(self.search)(phrase)
+        return [
+            (pk, rank) async for pk, rank in queryset.values_list("pk", "rank")[:limit]
+        ]
+
+    def cache_phrase(self, phrase):
+        """Return phrase as backend searches it, identifying its results in cache.
+        Ranks are sums over words, so word order doesn't matter."""
+        return " ".join(sorted(phrase.split()))
+
+    def order(self, queryset):
+        return queryset.order_by(*self.ordering)
+
+
+class InvertedIndexSearchBackend(SearchBackend):
+    """Search backend that ranks products in one query over SearchPosting table,
+    instead of scanning product fields.
+
+    Word of phrase matches tokens starting with it, so "hoe" matches "Hoes", but
+    unlike in icontains backend not "shoehorn". Every word counts once per field,
+    even if it's prefix of several tokens of the field."""
+
+    def search(self, phrase):
+        tokens = set(tokenize(phrase))
+        if not tokens:
+            return Product.objects.none()
+
+        fields = {**self.fields, **self.background_fields}
+        matches = Q()
+        ranks = list()
+        for token in tokens:
+            matches |= Q(postings__token__startswith=token)
+            for field in fields:
+                ranks.append(
+                    Max(
+                        Case(
+                            When(
+                                postings__token__startswith=token,
+                                postings__field=field,
+                                then=F("postings__weight"),
+                            ),
+                            default=Value(0.0),
+                            output_field=FloatField(),
+                        )
+                    )
+                )
+        queryset = Product.objects.filter(matches).annotate(
+            rank=reduce(operator.add, ranks)
+        )
+        return self.order(queryset)
+
+    def cache_phrase(self, phrase):
+        # Phrase is searched as normalized tokens.
+        return normalize_phrase(phrase)
+
+
+class IContainsSearchBackend(SearchBackend):
+    """Substring matching backend. Scans product table, meant for small catalogs
+    and as reference for other backends."""
+
+    def search(self, phrase):
+        words = phrase.split()
+        if not words:
+            return Product.objects.none()
+
+        matches = list()
+        for word in words:
+            for field, weight in self.fields.items():
+                matches.append(
+                    Case(
+                        When(Q(**{f"{field}__icontains": word}), then=Value(weight)),
+                        default=Value(0.0),
+                        output_field=FloatField(),
+                    )
+                )
+        queryset = Product.objects.annotate(rank=sum(matches[1:], matches[0])).filter(
+            rank__gt=0
+        )
+        return self.order(queryset)
+
+
+class FullTextSearchBackend(SearchBackend):
+    """PostgreSQL full text search backend. Matches phrase against GIN indexed
+    Product.search_vector and ranks with ts_rank. Falls back to
+    InvertedIndexSearchBackend on other databases."""
+
+    # Field names and their ts_rank weight labels.
+    vector_fields = {"producer": "A", "name": "B", "description": "C"}
+    # ts_rank weights for labels D, C, B, A. PostgreSQL allows weights up to 1.0, so
+    # name and producer priority rates are scaled by producer's rate.
+    weights = [0.1, 0.4, 1.0 / 1.2, 1.0]
+
+    def search(self, phrase):
+        if connection.vendor != "postgresql":
+            return InvertedIndexSearchBackend().search(phrase)
+
+        words = phrase.split()
+        if not words:
+            return Product.objects.none()
+
+        # Product matches if any of words matches, like in other backends.
+        config = settings.SEARCH_FULLTEXT_CONFIG
+        query = reduce(
+            operator.or_, (SearchQuery(word, config=config) for word in words)
+        )
+        queryset = Product.objects.filter(search_vector=query).annotate(
+            rank=SearchRank(F("search_vector"), query, weights=self.weights)
+        )
+        return self.order(queryset)
+
+
+class TrigramSearchBackend(SearchBackend):
+    """Typo tolerant backend. Product matches if any word of phrase is similar
+    enough to word in product's name or producer, rank is sum of similarities
+    multiplied by field's priority rate. On PostgreSQL matching is backed by
+    pg_trgm GIN indexes, on other databases similarities are counted in Python.
+
+    On PostgreSQL, queryset returned by search compares similarities with
+    SEARCH_TRIGRAM_THRESHOLD only when it's evaluated by results or aresults, or in
+    similarity_threshold block."""
+
+    def search(self, phrase):
+        words = phrase.split()
+        if not words:
+            return Product.objects.none()
+
+        if connection.vendor != "postgresql":
+            return self.python_search(words, settings.SEARCH_TRIGRAM_THRESHOLD)
+
+        # %> operator, that can use trigram index, compares with threshold set by
+        # similarity_threshold.
+        conditions = Q()
+        similarities = list()
+        for word in words:
+            for field, weight in self.fields.items():
+                conditions |= Q(**{f"{field}__trigram_word_similar": word})
+                similarities.append(weight * TrigramWordSimilarity(word, field))
+        queryset = Product.objects.filter(conditions).annotate(
+            rank=reduce(operator.add, similarities)
+        )
+        return self.order(queryset)
+
+    @contextmanager
+    def similarity_threshold(self):
+        """Set threshold of %> operator in transaction, for queries run in block.
+        SET LOCAL, unlike SET, doesn't stay on connection after transaction, so it
+        doesn't change queries of later requests served by persistent connection.
+        """
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SET LOCAL pg_trgm.word_similarity_threshold = %s",
+                        [settings.SEARCH_TRIGRAM_THRESHOLD],
+                    )
+            yield
+
+    def results(self, phrase, limit):
+        with self.similarity_threshold():
+            return super().results(phrase, limit)
+
+    async def aresults(self, phrase, limit):
+        # Transaction can't span async queries, results are fetched in thread.
+        return await sync_to_async(self.results)(phrase, limit)
+
+    def python_search(self, words, threshold):
+        """Fallback for databases without pg_trgm. Scans whole product table, so
+        it's meant for tests and small catalogs only."""
+        ranks = dict()
+        fields = self.fields.items()
+        for pk, *values in Product.objects.values_list("pk", *self.fields).iterator():
+            similarities = [
+                (trigram_word_similarity(word, value), weight)
+                for word in words
+                for (field, weight), value in zip(fields, values)
+            ]
+            if any(similarity > threshold for similarity, weight in similarities):
+                ranks[pk] = sum(similarity * weight for similarity, weight in similarities)
+
+        if not ranks:
+            return Product.objects.none()
+
+        queryset = Product.objects.filter(pk__in=ranks).annotate(
+            rank=Case(
+                *[When(pk=pk, then=Value(rank)) for pk, rank in ranks.items()],
+                output_field=FloatField(),
+            )
+        )
+        return self.order(queryset)
+
+
+SEARCH_BACKENDS = {
+    "index": InvertedIndexSearchBackend,
+    "fulltext": FullTextSearchBackend,
+    "icontains": IContainsSearchBackend,
+    "trigram": TrigramSearchBackend,
+}
+
+
+def normalize_phrase(phrase):
+    """Return phrase lowercased, with sorted words separated by single space, so
+    phrases differing only in word order share cache."""
+    return " ".join(sorted(normalize(phrase).split()))
+
+
+def search_cache_key(phrase, backend_name, version=None):
+    """Key of phrase's results. Built from phrase as backend searches it, e.g.
+    "Łódź" and "lodz" share results of index backend only."""
+    cache_phrase = get_search_backend(backend_name).cache_phrase(phrase)
+    digest = hashlib.md5(cache_phrase.encode()).hexdigest()
+    if version is None:
+        version = get_version(CATALOG_VERSION_KEY)
+    return f"products:search:{backend_name}:{version}:{digest}"
+
+
+class SearchResults(list):
+    """List of (pk, rank) pairs of products matching phrase, best match first.
+    Limited to SEARCH_CACHE_MAX_RESULTS, truncated tells if phrase has more
+    matches."""
+
+    def __init__(self, results=(), truncated=False):
+        super().__init__(results)
+        self.truncated = truncated
+
+
+def search_results(matches):
+    """Return SearchResults of (pk, rank) pairs, matches include one more than
+    SEARCH_CACHE_MAX_RESULTS, if there are more."""
+    limit = settings.SEARCH_CACHE_MAX_RESULTS
+    return SearchResults(
+        [(str(pk), rank) for pk, rank in matches[:limit]],
+        truncated=len(matches) > limit,
+    )
+
+
+def cached_search(phrase, backend_name=None):
+    """Return SearchResults of phrase. Results are cached until catalog version
+    changes."""
+    if backend_name is None:
+        backend_name = settings.SEARCH_BACKEND
+
+    key = search_cache_key(phrase, backend_name)
+    results = cache.get(key)
+    if results is None:
+        # One more match tells if results are truncated.
+        results = search_results(
+            get_search_backend(backend_name).results(
+                phrase, settings.SEARCH_CACHE_MAX_RESULTS + 1
+            )
+        )
+        cache.set(key, results, settings.SEARCH_CACHE_TIMEOUT)
+    return results
+
+
+async def acached_search(phrase, backend_name=None):
+    """Async cached_search, search query is run by async ORM."""
+    if backend_name is None:
+        backend_name = settings.SEARCH_BACKEND
+
+    version = await aget_version(CATALOG_VERSION_KEY)
+    key = search_cache_key(phrase, backend_name, version)
+    results = await cache.aget(key)
+    if results is None:
+        results = search_results(
+            await get_search_backend(backend_name).aresults(
+                phrase, settings.SEARCH_CACHE_MAX_RESULTS + 1
+            )
+        )
+        await cache.aset(key, results, settings.SEARCH_CACHE_TIMEOUT)
+    return results
+
+
+def get_search_backend(name=None):
+    """Return instance of search backend with given name, or configured one."""
+    if name is None:
+        name = settings.SEARCH_BACKEND
+    try:
+        return SEARCH_BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Search backend {name} doesn't exist.")
@@ -0,0 +1,81 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from categories.models import Category
+from images.models import Image
+
+from .autocomplete import AUTOCOMPLETE_VERSION_KEY, Autocomplete
+from .cache import bump_version
+from .cards import bump_card_version
+from .models import Product
+from .search import (
+    CATALOG_VERSION_KEY,
+    SearchBackend,
+    enqueue_indexing,
+    index_product,
+)
+
+# Sent with product_pk, when change of stock of product made with update is
+# committed.
+stock_changed = Signal()
+
+# Versions of cached data are bumped once change is committed. Bumped before,
+# concurrent request could rebuild data from before the change and cache it under
+# the new version.
+
+
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    """Keep product's search postings and full text search document up to date
+    with short searched fields, and queue product for indexing of long fields."""
+    if update_fields is None or set(update_fields) & set(SearchBackend.fields):
+        index_product(instance)
+    if update_fields is None or set(update_fields) & set(
+        SearchBackend.background_fields
+    ):
+        enqueue_indexing(instance)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_autocomplete(sender, instance, update_fields=None, **kwargs):
+    """Make autocomplete indexes of every process stale."""
+    if update_fields is None or set(update_fields) & set(Autocomplete.fields):
+        transaction.on_commit(lambda: bump_version(AUTOCOMPLETE_VERSION_KEY))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_catalog_version(sender, instance, **kwargs):
+    """Make cached search results and facets stale."""
+    transaction.on_commit(lambda: bump_version(CATALOG_VERSION_KEY))
+
+
+@receiver(m2m_changed, sender=Category.products.through)
+def bump_catalog_version_on_categories_change(sender, action, **kwargs):
+    """Make cached facets stale, when products are assigned to categories."""
+    if action.startswith("post_"):
+        transaction.on_commit(lambda: bump_version(CATALOG_VERSION_KEY))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def bump_product_card_version(sender, instance, **kwargs):
+    """Make cached card of product stale, e.g. when its price or stock changes."""
+    transaction.on_commit(lambda: bump_card_version(instance.pk))
+
+
+@receiver(stock_changed, sender=Product)
+def bump_product_card_version_on_stock_change(sender, product_pk, **kwargs):
+    """Make cached card of product stale, it shows number of products in stock."""
+    transaction.on_commit(lambda: bump_card_version(product_pk))
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def bump_product_card_version_on_image_change(sender, instance, **kwargs):
+    """Make cached card of image's product stale."""
+    transaction.on_commit(lambda: bump_card_version(instance.product_id))
@@ -0,0 +1,24 @@
+from django.db import transaction
+from django.db.models import F
+
+from .models import Product
+from .signals import stock_changed
+
+
+def change_stock(product_pk, quantity):
+    """Take quantity of product from stock, or give it back if negative, with single
+    conditional UPDATE, so concurrent requests can't take more than there is.
+
+    Return False, changing nothing, if there isn't enough in stock. Update doesn't
+    send post_save, receivers of stock_changed make cached product stale instead.
+    It's sent once caller's transaction is committed, so product isn't cached from
+    stock before the change.
+    """
+    updated = Product.objects.filter(pk=product_pk, count__gte=quantity).update(
+        count=F("count") - quantity
+    )
+    if updated:
+        transaction.on_commit(
+            lambda: stock_changed.send(sender=Product, product_pk=product_pk)
+        )
+    return bool(updated)
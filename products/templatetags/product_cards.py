@@ -0,0 +1,31 @@
+from django import template
+
+from pages.cache import add_page_products
+from products.cards import ProductCards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def load_product_cards(context, product_rows):
+    """Fetch cached cards of products in rows of (product, thumbnail) tuples, for
+    product_card tags below."""
+    products = [
+        product
+        for row in product_rows
+        for product, thumbnail in row
+        if product != "blank"
+    ]
+    context["product_cards"] = ProductCards(products)
+    add_page_products(context.get("request"), [product.pk for product in products])
+    return ""
+
+
+@register.simple_tag(takes_context=True)
+def product_card(context, product):
+    """Render product's card, from cache if product didn't change."""
+    cards = context.get("product_cards")
+    if cards is None:
+        cards = ProductCards([product])
+        add_page_products(context.get("request"), [product.pk])
+    return cards.render(product)
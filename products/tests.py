@@ -1,8 +1,41 @@
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import DatabaseError, connection, transaction
+from django.test import LiveServerTestCase, TestCase, override_settings
 from django.urls import reverse, resolve
-from .models import Product
-from .views import SearchResultView
+from .models import Product, SearchIndexTask, SearchPosting
+from .views import AsyncSearchResultView, ProductListView, SearchResultView
+from .stock import change_stock
+from .search import (
+    acached_search,
+    cached_search,
+    get_search_backend,
+    normalize_phrase,
+    process_index_queue,
+    search_cache_key,
+    tokenize,
+    trigram_similarity,
+)
+from .autocomplete import PrefixIndex, autocomplete
+from .cards import card_cache_stats, get_card_versions
+from .pagination import (
+    CursorPaginator,
+    InvalidCursor,
+    RankedListPaginator,
+    RowPaginator,
+    split_items_to_rows,
+)
+from .facets import Facets
+from categories.models import Category
+from django.http import QueryDict
+from django.apps import apps
+from django.core.management import CommandError, call_command
+import importlib
+import random
+from unittest import mock
+from products.management.commands.benchmark_search import (
+    Command as BenchmarkSearchCommand,
+)
+from io import StringIO
 from django.contrib.auth.models import Group
 from django.contrib.auth.models import Permission
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -11,20 +44,22 @@ import requests
 
 class ProductTests(TestCase):
     def setUp(self):
-        self.product = Product.objects.create(
-            name="Hoe",
-            producer="Universe",
-            price=25,
-            description="Test One",
-            count=1000,
-        )
-        Product.objects.create(
-            name="Scythe",
-            producer="Other Universe",
-            price=125,
-            description="Test Two",
-            count=100,
-        )
+        # Cached pages are made stale on commit of changes.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                name="Hoe",
+                producer="Universe",
+                price=25,
+                description="Test One",
+                count=1000,
+            )
+            Product.objects.create(
+                name="Scythe",
+                producer="Other Universe",
+                price=125,
+                description="Test Two",
+                count=100,
+            )
         self.user = get_user_model().objects.create(
             username="productuser", is_staff=True
         )
@@ -186,25 +221,27 @@ class ProductTests(TestCase):
 
 class SearchResultViewTest(TestCase):
     def setUp(self):
-        self.product = Product.objects.create(
-            name="Hoe",
-            producer="Universe",
-            price=2.5,
-            count=1000,
-        )
-        self.product2 = Product.objects.create(
-            name="Scythe",
-            producer="Some producer",
-            price=12.5,
-            count=500,
-        )
-        self.product3 = Product.objects.create(
-            name="Scythe",
-            producer="Hoe",
-            price=1234.5,
-            count=200,
-        )
-        self.response = self.client.get(reverse("search_result"))
+        # Cached data is invalidated on commit of changes.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                name="Hoe",
+                producer="Universe",
+                price=2.5,
+                count=1000,
+            )
+            self.product2 = Product.objects.create(
+                name="Scythe",
+                producer="Some producer",
+                price=12.5,
+                count=500,
+            )
+            self.product3 = Product.objects.create(
+                name="Scythe",
+                producer="Hoe",
+                price=1234.5,
+                count=200,
+            )
+            self.response = self.client.get(reverse("search_result"))
 
     def test_search_results_view(self):
         view = resolve("/products/search/")
@@ -236,8 +273,741 @@ class SearchResultViewTest(TestCase):
         response = self.client.get(reverse("search_result"), {"phrase": " "})
         self.assertContains(response, "No results to show.")
 
+    def test_async_search_results(self):
+        view = resolve("/products/search/async/")
+        self.assertEqual(AsyncSearchResultView.as_view().__name__, view.func.__name__)
+        for phrase in ("scythe", "producer", ""):
+            response = self.client.get(
+                reverse("search_result_async"), {"phrase": phrase}
+            )
+            expected = self.client.get(reverse("search_result"), {"phrase": phrase})
+            self.assertTemplateUsed(response, "search_result.html")
+            self.assertEqual(
+                list(response.context.get("page_obj", [])),
+                list(expected.context.get("page_obj", [])),
+            )
+
     def test_search_input_on_homepage(self):
         response = self.client.get(reverse("home"))
         self.assertContains(
             response, '<input name="phrase" type="text" placeholder="Search...">'
         )
+
+
+class SearchBackendTest(TestCase):
+    def setUp(self):
+        self.hoe = Product.objects.create(
+            name="Garden Hoe",
+            producer="Universe",
+            price=25,
+            count=1000,
+        )
+        self.scythe = Product.objects.create(
+            name="Scythe",
+            producer="Hoe",
+            price=125,
+            count=100,
+        )
+        self.rake = Product.objects.create(
+            name="Rake",
+            producer="Other Universe",
+            price=50,
+            count=10,
+        )
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("  Żółta  Garden-HOE "), ["zołta", "garden", "hoe"])
+
+    def test_postings_created_on_save(self):
+        tokens = set(
+            SearchPosting.objects.filter(product=self.hoe).values_list(
+                "token", "field"
+            )
+        )
+        self.assertEqual(
+            tokens, {("garden", "name"), ("hoe", "name"), ("universe", "producer")}
+        )
+
+    def test_postings_updated_on_save(self):
+        self.hoe.name = "Spade"
+        self.hoe.save()
+        self.assertFalse(SearchPosting.objects.filter(token="hoe", product=self.hoe))
+        self.assertTrue(SearchPosting.objects.filter(token="spade", product=self.hoe))
+
+    def test_postings_deleted_with_product(self):
+        self.hoe.delete()
+        self.assertFalse(SearchPosting.objects.filter(token="garden"))
+
+    def test_rank_weights(self):
+        results = list(get_search_backend("index").search("hoe"))
+        # Match in producer weights more than match in name.
+        self.assertEqual(results, [self.scythe, self.hoe])
+        self.assertEqual(results[0].rank, 1.2)
+        self.assertEqual(results[1].rank, 1.0)
+
+    def test_rank_sums_words(self):
+        results = list(get_search_backend("index").search("other universe"))
+        self.assertEqual(results, [self.rake, self.hoe])
+        self.assertAlmostEqual(results[0].rank, 2.4)
+
+    def test_words_match_token_prefixes(self):
+        hoes = Product.objects.create(
+            name="Hoes, hoe handles", producer="Acme", price=10, count=1
+        )
+        shoehorn = Product.objects.create(
+            name="Shoehorn", producer="Acme", price=10, count=1
+        )
+        results = {
+            product: product.rank
+            for product in get_search_backend("index").search("hoe")
+        }
+        # Word counts once per field, though it starts two tokens of hoes' name.
+        self.assertEqual(results, {self.scythe: 1.2, self.hoe: 1.0, hoes: 1.0})
+        self.assertNotIn(shoehorn, results)
+
+    def test_search_in_one_query(self):
+        with self.assertNumQueries(1):
+            list(get_search_backend("index").search("garden hoe universe"))
+
+    def test_blank_phrase(self):
+        self.assertFalse(get_search_backend("index").search("  "))
+
+    def test_backends_agree_on_whole_words(self):
+        for phrase in ("hoe", "other universe", "rake scythe"):
+            self.assertEqual(
+                list(get_search_backend("index").search(phrase)),
+                list(get_search_backend("icontains").search(phrase)),
+            )
+
+    def test_fulltext_backend_fallback(self):
+        if connection.vendor == "postgresql":
+            self.skipTest("Fallback is used on databases other than PostgreSQL.")
+        self.assertEqual(
+            list(get_search_backend("fulltext").search("other universe")),
+            list(get_search_backend("index").search("other universe")),
+        )
+
+    def test_fulltext_backend(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("Full text search requires PostgreSQL.")
+        self.rake.description = "Rake for collecting leaves"
+        self.rake.save()
+        process_index_queue()
+        results = list(get_search_backend("fulltext").search("hoe leaves"))
+        self.assertEqual(results[0], self.scythe)
+        self.assertIn(self.hoe, results)
+        self.assertIn(self.rake, results)
+
+    def test_description_indexed_in_background(self):
+        self.rake.description = "Rake for collecting leaves, not a hoe"
+        self.rake.save()
+        self.assertTrue(SearchIndexTask.objects.filter(product=self.rake))
+        self.assertFalse(SearchPosting.objects.filter(field="description"))
+
+        # Rake was queued once, when it was created.
+        self.assertEqual(process_index_queue(), 3)
+        self.assertFalse(SearchIndexTask.objects.exists())
+        self.assertEqual(process_index_queue(), 0)
+        results = list(get_search_backend("index").search("hoe"))
+        # Match in description weights less than in name and producer.
+        self.assertEqual(results, [self.scythe, self.hoe, self.rake])
+        self.assertAlmostEqual(results[2].rank, 0.4)
+
+    def test_search_index_not_queued_for_unsearched_fields(self):
+        SearchIndexTask.objects.all().delete()
+        self.rake.count = 5
+        self.rake.save(update_fields=["count"])
+        self.assertFalse(SearchIndexTask.objects.exists())
+
+    def test_search_index_not_queued_for_short_fields(self):
+        # Their postings and part of full text search document are written on save.
+        SearchIndexTask.objects.all().delete()
+        self.rake.name = "Leaf rake"
+        self.rake.save(update_fields=["name"])
+        self.assertFalse(SearchIndexTask.objects.exists())
+        self.assertEqual(
+            list(get_search_backend("fulltext").search("leaf")), [self.rake]
+        )
+
+    def test_product_queued_once(self):
+        SearchIndexTask.objects.all().delete()
+        for description in ("Leaves", "Leaves and grass"):
+            self.rake.description = description
+            self.rake.save()
+        self.assertEqual(SearchIndexTask.objects.filter(product=self.rake).count(), 1)
+
+    def test_search_index_worker_survives_failed_batch(self):
+        out, err = StringIO(), StringIO()
+        with mock.patch(
+            "products.management.commands.search_index_worker.process_index_queue",
+            side_effect=[DatabaseError("deadlock detected"), 3, KeyboardInterrupt],
+        ), mock.patch("time.sleep"):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command("search_index_worker", stdout=out, stderr=err)
+        self.assertIn("Indexing failed: deadlock detected", err.getvalue())
+        with mock.patch(
+            "products.management.commands.search_index_worker.process_index_queue",
+            side_effect=DatabaseError("deadlock detected"),
+        ):
+            with self.assertRaises(CommandError):
+                call_command("search_index_worker", once=True, stdout=out)
+
+    def test_search_index_worker(self):
+        out = StringIO()
+        call_command("search_index_worker", once=True, stdout=out)
+        self.assertEqual(out.getvalue(), "Processed 3 tasks.\n")
+        self.assertFalse(SearchIndexTask.objects.exists())
+
+    def test_existing_products_queued_by_migration(self):
+        migration = importlib.import_module(
+            "products.migrations.0022_queue_description_indexing"
+        )
+        SearchIndexTask.objects.all().delete()
+        migration.queue_products(apps, None)
+        self.assertCountEqual(
+            SearchIndexTask.objects.values_list("product", flat=True),
+            [self.hoe.pk, self.scythe.pk, self.rake.pk],
+        )
+
+    def test_rebuild_search_index(self):
+        self.rake.description = "Leaves"
+        self.rake.save()
+        SearchPosting.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_search_index", batch_size=2, stdout=out)
+        self.assertIn("Indexed 3 products.", out.getvalue())
+        self.assertFalse(SearchIndexTask.objects.exists())
+        self.assertEqual(
+            list(get_search_backend("index").search("leaves")), [self.rake]
+        )
+        self.assertEqual(
+            list(get_search_backend("index").search("hoe")), [self.scythe, self.hoe]
+        )
+
+    def test_trigram_similarity(self):
+        self.assertEqual(trigram_similarity("Hoe", "hoe"), 1.0)
+        self.assertEqual(trigram_similarity("hoe", "rake"), 0.0)
+        # "  u", " un", "uni", "niv", "rse", "se " shared out of 11 trigrams.
+        self.assertAlmostEqual(trigram_similarity("univrse", "universe"), 6 / 11)
+
+    def test_trigram_backend_typos(self):
+        results = get_search_backend("trigram").search("Univrse")
+        self.assertCountEqual(results, [self.hoe, self.rake])
+        self.assertAlmostEqual(results[0].rank, 1.2 * 6 / 11)
+
+    def test_trigram_backend_threshold(self):
+        with self.settings(SEARCH_TRIGRAM_THRESHOLD=0.6):
+            self.assertFalse(get_search_backend("trigram").search("Univrse"))
+
+    def test_trigram_backend_exact_match_weights(self):
+        results = list(get_search_backend("trigram").search("hoe"))
+        self.assertEqual(results, [self.scythe, self.hoe])
+
+    def test_trigram_backend_results(self):
+        # Evaluated in transaction setting similarity threshold on PostgreSQL.
+        self.assertEqual(
+            get_search_backend("trigram").results("hoe", 10),
+            [(self.scythe.pk, 1.2), (self.hoe.pk, 1.0)],
+        )
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_search_backend("unknown")
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        # Indexes are invalidated on commit.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                name="Garden Hoe",
+                producer="Universe",
+                price=25,
+                count=1000,
+            )
+            Product.objects.create(
+                name="Garden Rake",
+                producer="Other Universe",
+                price=50,
+                count=10,
+            )
+
+    def test_prefix_index(self):
+        index = PrefixIndex(["Garden Hoe", "Garden Rake", "Hoe", "Scythe"])
+        self.assertEqual(index.complete("gar"), ["Garden Hoe", "Garden Rake"])
+        self.assertEqual(index.complete("ho"), ["Garden Hoe", "Hoe"])
+        self.assertEqual(index.complete("garden  r"), ["Garden Rake"])
+        self.assertEqual(index.complete("gar", limit=1), ["Garden Hoe"])
+        self.assertEqual(index.complete("x"), [])
+        self.assertEqual(index.complete(" "), [])
+
+    def test_autocomplete_view(self):
+        response = self.client.get(
+            reverse("search_autocomplete"), {"prefix": "uni", "limit": 5}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {"names": [], "producers": ["Other Universe", "Universe"]},
+        )
+
+    def test_autocomplete_without_queries(self):
+        autocomplete.complete("gar")
+        with self.assertNumQueries(0):
+            self.client.get(reverse("search_autocomplete"), {"prefix": "gar"})
+
+    def test_autocomplete_invalidated_on_change(self):
+        self.assertEqual(autocomplete.complete("spa")["names"], [])
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.name = "Spade"
+            self.product.save()
+        # Index isn't rebuilt from product before its change is committed.
+        self.assertEqual(autocomplete.complete("spa")["names"], [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(autocomplete.complete("spa")["names"], ["Spade"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertEqual(autocomplete.complete("spa")["names"], [])
+
+
+class SearchPaginationTest(TestCase):
+    def setUp(self):
+        # Cached data is invalidated on commit of changes.
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(7):
+                Product.objects.create(
+                    name=f"Hoe {index}",
+                    producer="Hoe" if index % 3 == 0 else "Universe",
+                    price=25,
+                    count=10,
+                )
+            self.queryset = get_search_backend("index").search("hoe")
+            self.ranked = list(self.queryset)
+
+    def get_paginator(self):
+        return CursorPaginator(self.queryset, per_page=3, ordering=("-rank", "pk"))
+
+    def test_pages_in_rank_order(self):
+        paginator = self.get_paginator()
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([product for page in pages for product in page], self.ranked)
+        self.assertFalse(pages[0].has_previous())
+
+    def test_previous_page(self):
+        paginator = self.get_paginator()
+        second = paginator.page(paginator.page().next_cursor)
+        third = paginator.page(second.next_cursor)
+        self.assertEqual(list(paginator.page(third.previous_cursor)), list(second))
+        first = paginator.page(second.previous_cursor)
+        self.assertEqual(list(first), self.ranked[:3])
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            self.get_paginator().page("invalid")
+
+    def test_ranked_list_pages(self):
+        results = [(str(product.pk), product.rank) for product in self.ranked]
+        paginator = RankedListPaginator(results, Product.objects.all(), per_page=3)
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        third = paginator.page(second.next_cursor)
+        self.assertEqual(list(first) + list(second) + list(third), self.ranked)
+        self.assertEqual([product.rank for product in second], [1.0, 1.0, 1.0])
+        self.assertFalse(third.has_next())
+        self.assertEqual(list(paginator.page(third.previous_cursor)), list(second))
+        self.assertEqual(list(paginator.page(second.previous_cursor)), list(first))
+
+    def test_search_view_pages(self):
+        SearchResultView.paginate_by_row, paginate_by_row = (
+            1,
+            SearchResultView.paginate_by_row,
+        )
+        self.addCleanup(setattr, SearchResultView, "paginate_by_row", paginate_by_row)
+        response = self.client.get(reverse("search_result"), {"phrase": "hoe"})
+        page = response.context["page_obj"]
+        self.assertEqual(list(page), self.ranked[:4])
+        # Ranked page only, thumbnails are stored on products.
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("search_result"), {"phrase": "hoe", "cursor": page.next_cursor}
+            )
+        self.assertEqual(list(response.context["page_obj"]), self.ranked[4:])
+
+    def test_search_view_invalid_cursor(self):
+        response = self.client.get(
+            reverse("search_result"), {"phrase": "hoe", "cursor": "invalid"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductListPaginationTest(TestCase):
+    def setUp(self):
+        # Cached pages are made stale on commit of changes.
+        with self.captureOnCommitCallbacks(execute=True):
+            # Equal names, so pages are split by pk as well.
+            for index in range(10):
+                Product.objects.create(
+                    name=f"Rake {index // 2}", producer="Universe", price=25, count=10
+                )
+        self.products = list(Product.objects.order_by("name", "pk"))
+        ProductListView.paginate_by_row, paginate_by_row = (
+            1,
+            ProductListView.paginate_by_row,
+        )
+        self.addCleanup(setattr, ProductListView, "paginate_by_row", paginate_by_row)
+
+    def test_cursor_pages(self):
+        pages = [self.client.get(reverse("product_list")).context["page_obj"]]
+        while pages[-1].has_next():
+            # Page of products only, without COUNT(*).
+            with self.assertNumQueries(1):
+                response = self.client.get(
+                    reverse("product_list"), {"cursor": pages[-1].next_cursor}
+                )
+            pages.append(response.context["page_obj"])
+        self.assertEqual([len(page) for page in pages], [4, 4, 2])
+        self.assertEqual([product for page in pages for product in page], self.products)
+        self.assertEqual(len(response.context["product_rows"]), 1)
+
+        response = self.client.get(
+            reverse("product_list"), {"cursor": pages[-1].previous_cursor}
+        )
+        self.assertEqual(list(response.context["page_obj"]), list(pages[1]))
+        self.assertContains(response, "?cursor=")
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("product_list"), {"cursor": "invalid"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_pagination(self):
+        with self.settings(PRODUCT_LIST_PAGINATION="page"):
+            # COUNT(*) and page's slice of products.
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse("product_list"), {"page": 2})
+        self.assertContains(response, "Page 2 of 3.")
+        self.assertEqual(
+            [product for product, thumbnail in response.context["product_rows"][0]],
+            self.products[4:8],
+        )
+
+
+class RowPaginatorTest(TestCase):
+    def test_page_rows(self):
+        paginator = RowPaginator(
+            list(range(10)), per_page=2, rows_count=3, split=split_items_to_rows
+        )
+        self.assertEqual(paginator.num_pages, 2)
+        self.assertEqual(list(paginator.page(1)), [[0, 1, 2], [3, 4, 5]])
+        self.assertEqual(list(paginator.page(2)), [[6, 7, 8], [9, "blank", "blank"]])
+        self.assertEqual(paginator.page(2).start_index(), 7)
+
+
+class ProductCardCacheTest(TestCase):
+    def setUp(self):
+        self.hoe = Product.objects.create(
+            name="Hoe", producer="Universe", price=2500, count=10
+        )
+        self.rake = Product.objects.create(
+            name="Rake", producer="Universe", price=5000, count=0
+        )
+
+    def get_stats_change(self, stats):
+        current = card_cache_stats()
+        return {key: current[key] - stats[key] for key in stats}
+
+    # Render page again, instead of serving it from page cache.
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_cards_served_from_cache(self):
+        self.client.get(reverse("product_list"))
+        stats = card_cache_stats()
+        response = self.client.get(reverse("product_list"))
+        self.assertEqual(self.get_stats_change(stats), {"hits": 2, "misses": 0})
+        self.assertContains(response, "In stock. 10 left.")
+        self.assertContains(response, "Not in stock.")
+        # Add to cart form isn't cached.
+        self.assertContains(response, "cart_add_button", count=1)
+
+    def test_card_stale_on_product_change(self):
+        self.client.get(reverse("product_list"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hoe.count = 7
+            self.hoe.save()
+        stats = card_cache_stats()
+        response = self.client.get(reverse("product_list"))
+        self.assertEqual(self.get_stats_change(stats), {"hits": 1, "misses": 1})
+        self.assertContains(response, "In stock. 7 left.")
+
+    def test_card_stale_on_commit_of_stock_change(self):
+        version = get_card_versions([self.hoe.pk])[self.hoe.pk]
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                change_stock(self.hoe.pk, 3)
+            # Card rendered now would show stock from before the change.
+            self.assertEqual(get_card_versions([self.hoe.pk])[self.hoe.pk], version)
+        self.assertNotEqual(get_card_versions([self.hoe.pk])[self.hoe.pk], version)
+
+    def test_card_stale_on_image_change(self):
+        self.client.get(reverse("product_list"))
+        version = get_card_versions([self.rake.pk])[self.rake.pk]
+        with self.captureOnCommitCallbacks(execute=True):
+            image = self.rake.images.create(image="product_images/rake.png", place=0)
+        self.assertNotEqual(get_card_versions([self.rake.pk])[self.rake.pk], version)
+        version = get_card_versions([self.rake.pk])[self.rake.pk]
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertNotEqual(get_card_versions([self.rake.pk])[self.rake.pk], version)
+
+    def test_card_stats_command(self):
+        out = StringIO()
+        call_command("product_card_stats", reset=True, stdout=out)
+        self.assertIn("hit ratio", out.getvalue())
+        self.assertEqual(card_cache_stats(), {"hits": 0, "misses": 0})
+
+
+class SearchCacheTest(TestCase):
+    def setUp(self):
+        # Cached data is invalidated on commit of changes.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                name="Garden Hoe",
+                producer="Universe",
+                price=25,
+                count=1000,
+            )
+
+    def test_normalize_phrase(self):
+        self.assertEqual(normalize_phrase("  Hoe \t GARDEN "), "garden hoe")
+        self.assertEqual(
+            search_cache_key("Hoe garden", "index"),
+            search_cache_key("garden   hoe", "index"),
+        )
+
+    def test_key_built_from_searched_phrase(self):
+        # Index backend searches normalized tokens, icontains the phrase as given.
+        self.assertEqual(
+            search_cache_key("Zürich", "index"), search_cache_key("zurich", "index")
+        )
+        self.assertNotEqual(
+            search_cache_key("Zürich", "icontains"),
+            search_cache_key("zurich", "icontains"),
+        )
+        self.assertEqual(
+            search_cache_key("Hoe garden", "icontains"),
+            search_cache_key("garden   Hoe", "icontains"),
+        )
+
+    def test_accented_phrase_doesnt_share_icontains_results(self):
+        zurich = Product.objects.create(
+            name="Zürich map", producer="Universe", price=1, count=1
+        )
+        self.assertEqual(cached_search("Zürich", "icontains"), [(str(zurich.pk), 1.0)])
+        self.assertEqual(cached_search("zurich", "icontains"), [])
+
+    def test_cached_results(self):
+        results = cached_search("hoe garden", "index")
+        self.assertEqual(results, [(str(self.product.pk), 2.0)])
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_search("Garden HOE", "index"), results)
+
+    def test_results_stale_on_product_change(self):
+        cached_search("spade", "index")
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.name = "Spade"
+            self.product.save()
+        # Results searched before change is committed aren't cached as fresh.
+        self.assertEqual(cached_search("spade", "index"), [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(
+            cached_search("spade", "index"), [(str(self.product.pk), 1.0)]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertEqual(cached_search("spade", "index"), [])
+
+    async def test_async_cached_results(self):
+        results = await acached_search("hoe garden", "index")
+        self.assertEqual(results, [(str(self.product.pk), 2.0)])
+        self.assertEqual(await acached_search("Garden HOE", "index"), results)
+
+    def test_max_results(self):
+        Product.objects.create(name="Hoe", producer="Hoe", price=1, count=1)
+        with self.settings(SEARCH_CACHE_MAX_RESULTS=1):
+            results = cached_search("garden", "index")
+            self.assertFalse(results.truncated)
+            results = cached_search("hoe", "index")
+            self.assertEqual(len(results), 1)
+            self.assertTrue(results.truncated)
+            # Cached with the flag.
+            self.assertTrue(cached_search("hoe", "index").truncated)
+            response = self.client.get(reverse("search_result"), {"phrase": "hoe"})
+        self.assertContains(response, "Only 1 best matches are shown.")
+
+
+class FacetsTest(TestCase):
+    def setUp(self):
+        # Cached data is invalidated on commit of changes.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tools = Category.objects.create(name="Tools")
+            self.garden = Category.objects.create(name="Garden")
+            self.hoe = Product.objects.create(
+                name="Hoe", producer="Universe", price=500, count=1
+            )
+            self.rake = Product.objects.create(
+                name="Rake", producer="Universe", price=2500, count=1
+            )
+            self.scythe = Product.objects.create(
+                name="Scythe", producer="Other", price=60000, count=1
+            )
+            self.tools.products.add(self.hoe, self.rake, self.scythe)
+            self.garden.products.add(self.rake)
+
+    def get_facets(self, query=""):
+        return Facets(Product.objects.all(), QueryDict(query), scope="test")
+
+    def test_counts(self):
+        with self.assertNumQueries(3):
+            counts = self.get_facets().get_counts()
+        self.assertEqual(
+            [(facet["label"], facet["count"]) for facet in counts["category"]],
+            [("Garden", 1), ("Tools", 3)],
+        )
+        self.assertEqual(
+            [(facet["label"], facet["count"]) for facet in counts["producer"]],
+            [("Universe", 2), ("Other", 1)],
+        )
+        self.assertEqual(
+            [(facet["value"], facet["count"]) for facet in counts["price"]],
+            [("0-1000", 1), ("1000-5000", 1), ("50000-", 1)],
+        )
+
+    def test_counts_cached(self):
+        self.get_facets().get_counts()
+        with self.assertNumQueries(0):
+            self.get_facets().get_counts()
+
+    def test_counts_stale_on_category_change(self):
+        self.get_facets().get_counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.garden.products.add(self.hoe)
+        counts = self.get_facets().get_counts()
+        self.assertEqual(counts["category"][0]["count"], 2)
+
+    def test_filter(self):
+        self.assertCountEqual(
+            self.get_facets("producer=Universe").filter(), [self.hoe, self.rake]
+        )
+        self.assertCountEqual(
+            self.get_facets(f"category={self.garden.pk}&category={self.tools.pk}")
+            .filter(),
+            [self.hoe, self.rake, self.scythe],
+        )
+        self.assertCountEqual(
+            self.get_facets("price=0-1000&price=50000-").filter(),
+            [self.hoe, self.scythe],
+        )
+        self.assertCountEqual(
+            self.get_facets("producer=Universe&price=1000-5000").filter(),
+            [self.rake],
+        )
+
+    def test_invalid_selection_ignored(self):
+        facets = self.get_facets("category=x&price=1-2")
+        self.assertFalse(facets.is_selected())
+
+    def test_counts_of_other_facets_selected(self):
+        counts = self.get_facets("producer=Universe").get_counts()
+        # Other producers stay visible, other facets are narrowed.
+        self.assertEqual(len(counts["producer"]), 2)
+        self.assertTrue(counts["producer"][0]["selected"])
+        self.assertEqual(
+            [(facet["label"], facet["count"]) for facet in counts["category"]],
+            [("Garden", 1), ("Tools", 2)],
+        )
+
+    def test_narrow_results(self):
+        results = [(str(self.scythe.pk), 2.0), (str(self.rake.pk), 1.0)]
+        facets = self.get_facets("producer=Universe")
+        self.assertEqual(facets.narrow(results), [(str(self.rake.pk), 1.0)])
+
+    def test_search_view_facets(self):
+        response = self.client.get(
+            reverse("search_result"), {"phrase": "hoe rake", "price": "1000-5000"}
+        )
+        self.assertEqual(list(response.context["page_obj"]), [self.rake])
+        self.assertEqual(
+            [facet["count"] for facet in response.context["facets"]["price"]],
+            [1, 1],
+        )
+        self.assertContains(response, 'name="price" value="1000-5000"')
+
+
+class BenchmarkSearchCommandTest(TestCase):
+    def test_benchmark(self):
+        out = StringIO()
+        call_command(
+            "benchmark_search",
+            sizes=[40],
+            backends=["view", "index", "icontains"],
+            repeat=2,
+            stdout=out,
+        )
+        report = out.getvalue()
+        self.assertIn("Catalog of 40 products:", report)
+        for backend_name in ("view", "index", "icontains"):
+            self.assertIn(f"  {backend_name} ", report)
+        self.assertIn("recall@10 1.00", report)
+        # Synthetic catalog is rolled back.
+        self.assertFalse(Product.objects.exists())
+
+    def test_real_search_results_after_benchmark(self):
+        hoe = Product.objects.create(
+            name="Garden hoe", producer="Universe", price=1, count=1
+        )
+        phrases = ["hoe", "garden hoe"] + [
+            phrase
+            for phrase, relevant in BenchmarkSearchCommand().get_golden_set(
+                random.Random(0)
+            )
+        ]
+        call_command(
+            "benchmark_search",
+            sizes=[40],
+            backends=["view"],
+            repeat=1,
+            stdout=StringIO(),
+        )
+        for phrase in phrases:
+            expected = [
+                (str(pk), rank)
+                for pk, rank in get_search_backend()
+                .search(phrase)
+                .values_list("pk", "rank")
+            ]
+            self.assertEqual(cached_search(phrase), expected)
+        self.assertEqual(cached_search("hoe"), [(str(hoe.pk), 1.0)])
+
+
+class LoadTestSearchCommandTest(LiveServerTestCase):
+    def test_load_test(self):
+        Product.objects.create(name="Hoe", producer="Universe", price=1, count=1)
+        out = StringIO()
+        call_command(
+            "load_test_search",
+            targets=[
+                f"wsgi={self.live_server_url}{reverse('search_result')}",
+                f"asgi={self.live_server_url}{reverse('search_result_async')}",
+            ],
+            concurrency=[1, 2],
+            requests=4,
+            stdout=out,
+        )
+        report = out.getvalue()
+        self.assertIn("Concurrency 2:", report)
+        self.assertEqual(report.count("errors 0"), 4)
@@ -1,19 +1,22 @@
 from django.urls import path
+from pages.cache import shared_page_cache
 from .views import (
     ProductCreateView,
     ProductListView,
     ProductDetailsView,
     SearchResultView,
+    AsyncSearchResultView,
+    AutocompleteView,
     EditProductDetailsView,
     EditReviewProductDetailsView,
     ProductManageCategoriesView,
 )
 
 urlpatterns = [
-    path("", ProductListView.as_view(), name="product_list"),
+    path("", shared_page_cache(ProductListView.as_view()), name="product_list"),
     path(
         "<uuid:pk>/",
-        ProductDetailsView.as_view(),
+        shared_page_cache(ProductDetailsView.as_view()),
         name="product_details",
     ),
     # Class views with "Edit" prefix, refers to update which post form is on
@@ -29,6 +32,16 @@ urlpatterns = [
         name="review_details_edit",
     ),
     path("search/", SearchResultView.as_view(), name="search_result"),
+    path(
+        "search/async/",
+        AsyncSearchResultView.as_view(),
+        name="search_result_async",
+    ),
+    path(
+        "search/autocomplete/",
+        AutocompleteView.as_view(),
+        name="search_autocomplete",
+    ),
     path("create/", ProductCreateView.as_view(), name="product_create"),
     path(
         "<uuid:pk>/checkbox",
@@ -1,4 +1,6 @@
-from django.http import HttpResponseRedirect
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponseRedirect, JsonResponse
 from django.urls import reverse
 from django.shortcuts import render
 from django.views.generic import (
@@ -9,85 +11,103 @@ from django.views.generic import (
     UpdateView,
     FormView,
     DeleteView,
+    View,
 )
 from django.db.models import Prefetch
+from django.core.paginator import InvalidPage
 from django.contrib.auth.mixins import (
     LoginRequiredMixin,
 )
 from django import forms
 
 from .models import Product
+from .search import acached_search, cached_search, get_search_backend
+from .facets import Facets
+from .pagination import (
+    CursorPaginator,
+    RankedListPaginator,
+    RowPaginator,
+    split_to_rows,
+)
+from .autocomplete import autocomplete
 from categories.models import Category
+from pages.cache import add_page_products
 from .forms import (
     ProductForm,
     ProductFormWithImage,
     CheckboxForm,
 )
-from images.models import Image
+from images.models import Image, update_product_thumbnail
 from images.forms import ImageForm
 from images.views import ImageManagerView
 from reviews.forms import ReviewForm
 from reviews.models import Review
 from reviews.views import CreateReviewView
-from transactions.views import CartView
+from transactions.views import add_to_cart
 from accounts.utils.utils import StaffPrivilegesRequiredMixin
 
 
-from itertools import chain
-
-
 class ProductListView(ListView):
     model = Product
     template_name = "product_list.html"
     ordering = "name"
     rows_count = 4
     paginate_by_row = 5
-    queryset = Product.objects.prefetch_related(
-        Prefetch("images", Image.objects.filter(place=0), to_attr="thumbnail")
-    )
+    # "page" or "cursor", PRODUCT_LIST_PAGINATION setting if None.
+    pagination = None
+    # Unique order of cursor pagination, backed by index.
+    cursor_ordering = ("name", "pk")
 
     def get_context_data(self, **kwargs):
-        """split product to rows to display them on page, and add thumbnail
-        (product, thumbnail) for self.rows_count in row"""
-        product_rows = list()
-        row = list()
-        queryset = self.get_queryset()
-
-        for index, object in enumerate(queryset):
-            if object.thumbnail:
-                # There should be queryset with only one product, because of filter in
-                # prefetch, so record of index 0 should be only one possible.
-                thumbnail = object.thumbnail[0]
-                row.append((object, thumbnail))
-            else:
-                row.append((object, "no thumbnail"))
+        """Add page of product rows, (product, thumbnail) tuples for self.rows_count
+        in row."""
+        if self.get_pagination() == "cursor":
+            return self.get_cursor_context_data(**kwargs)
 
-            # Add row every self.rows_count'th iteration
-            if ((index + 1) % self.rows_count) == 0:
-                product_rows.append(row)
-                row = list()
+        # Instance may be used just for context, without get() setting object_list.
+        kwargs.setdefault("object_list", self.get_queryset())
+        context = super().get_context_data(**kwargs)
+        context["product_rows"] = context["page_obj"]
+        return context
 
-        # Add blank items to row to make last row the same length
-        for index in range(self.rows_count - (queryset.count() % self.rows_count)):
-            row.append(("blank", "no thumbnail"))
-        product_rows.append(row)
-        return super().get_context_data(object_list=product_rows, **kwargs)
+    def get_cursor_context_data(self, **kwargs):
+        """Paginate products with cursor, page's products are fetched with one
+        query regardless of page's depth."""
+        paginator = CursorPaginator(
+            self.get_queryset(),
+            per_page=self.rows_count * self.paginate_by_row,
+            ordering=self.cursor_ordering,
+        )
+        try:
+            page = paginator.page(self.request.GET.get("cursor"))
+        except InvalidPage:
+            raise Http404("Invalid cursor.")
+        context = super().get_context_data(object_list=page.object_list, **kwargs)
+        context["page_obj"] = page
+        context["product_rows"] = split_to_rows(page, self.rows_count)
+        context["cursor_pagination"] = True
+        return context
+
+    def get_pagination(self):
+        return self.pagination or settings.PRODUCT_LIST_PAGINATION
 
     def get_paginate_by(self, queryset):
         """Get the number of rows to paginate."""
+        if self.get_pagination() == "cursor":
+            # Paginated by CursorPaginator instead.
+            return None
         return self.paginate_by_row
 
+    def get_paginator(self, queryset, per_page, **kwargs):
+        return RowPaginator(queryset, per_page, self.rows_count, **kwargs)
+
     def post(self, request, *args, **kwargs):
         if "cart_add_button" in request.POST:
             self.cart_add_button(request)
         return HttpResponseRedirect(reverse("product_list"))
 
     def cart_add_button(self, request):
-        if request.user.is_authenticated:
-            cart = request.user.carts.get(transaction=None)
-            CartView.as_view()(
-                request, pk=cart.pk, product_pk=request.POST["product_pk"]
-            )
+        add_to_cart(request, request.POST["product_pk"])
 
 
 # TODO make it look like CategoryListView or just make custom form
@@ -106,8 +126,7 @@ class ProductDetailsView(DetailView):
         """Create review using CreateReviewView instance"""
 
         if "cart_add_button" in request.POST:
-            cart = request.user.carts.get(transaction=None)
-            CartView.as_view()(request, pk=cart.pk, product_pk=kwargs["pk"])
+            add_to_cart(request, kwargs["pk"])
         if "review_add_button" in request.POST:
             view = CreateReviewView()
             view.request = self.request
@@ -121,6 +140,8 @@ class ProductDetailsView(DetailView):
         context["new_review"] = "You can enter your review here. "
         context["reviews"] = self.object.reviews.all()
         context["images"] = ImageManagerView.get_sorted_images(self, self.object)
+        # Shows product's stock.
+        add_page_products(self.request, [self.object.pk])
         return context
 
 
@@ -142,6 +163,7 @@ class ProductCreateView(StaffPrivilegesRequiredMixin, CreateView):
             if image_form.is_valid():
                 for index, image in enumerate(files.getlist("image")):
                     Image.objects.create(product=self.object, image=image, place=index)
+                update_product_thumbnail(self.object)
             elif image_form.is_bound:
                 form.add_error(None, image_form.errors["image"])
                 return super().form_invalid(form)
@@ -332,65 +354,83 @@ class EditReviewProductDetailsView(LoginRequiredMixin, ProductDetailsView):
 
 
 class SearchResultView(TemplateView):
+    """Search results in rank order. Ranked results are cached and paginated with
+    cursor, so page costs one query for its products instead of searching and
+    sorting again."""
+
     template_name = "search_result.html"
+    rows_count = ProductListView.rows_count
+    paginate_by_row = ProductListView.paginate_by_row
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         phrase = self.request.GET.get("phrase", None)
         if phrase:
             context["phrase"] = phrase
-            search_results = self.search(phrase)
-            queryset = Product.objects.filter(
-                pk__in={product.pk for product in search_results}
-            )
-            associated_products_context = ProductListView(
-                queryset=queryset.prefetch_related(
-                    Prefetch(
-                        "images", Image.objects.filter(place=0), to_attr="thumbnail"
-                    )
+            results = self.search(phrase)
+            # Only best matches are listed and counted in facets.
+            context["results_truncated"] = getattr(results, "truncated", False)
+            context["max_results"] = settings.SEARCH_CACHE_MAX_RESULTS
+            facets = Facets(
+                Product.objects.filter(pk__in=[pk for pk, rank in results]),
+                self.request.GET,
+                scope=(
+                    f"search:{settings.SEARCH_BACKEND}:"
+                    f"{get_search_backend().cache_phrase(phrase)}"
                 ),
-                kwargs=kwargs,
-                request=self.request,
-            ).get_context_data()
+            )
+            context["facets"] = facets.get_counts()
+            context["facets_query"] = facets.query_string()
+            paginator = RankedListPaginator(
+                facets.narrow(results),
+                Product.objects.all(),
+                per_page=self.rows_count * self.paginate_by_row,
+            )
+            try:
+                page = paginator.page(self.request.GET.get("cursor"))
+            except InvalidPage:
+                raise Http404("Invalid cursor.")
+            if page:
+                context["page_obj"] = page
+                context["product_rows"] = split_to_rows(page, self.rows_count)
+        return context
+
+    def search(self, phrase):
+        """Return SearchResults, list of (pk, rank) pairs of products matching
+        phrase, best match first. Search is done by backend chosen in SEARCH_BACKEND
+        setting."""
+        return cached_search(phrase)
+
 
-            merged_context = {**context, **associated_products_context}
-        return merged_context
+class AsyncSearchResultView(SearchResultView):
+    """SearchResultView running search query with async ORM. Served by ASGI server
+    (config.asgi), waiting for search doesn't block worker. Facets and page are
+    built in thread, as they need sync ORM."""
+
+    async def get(self, request, *args, **kwargs):
+        phrase = request.GET.get("phrase", None)
+        self.results = await acached_search(phrase) if phrase else None
+        return await sync_to_async(super().get)(request, *args, **kwargs)
 
     def search(self, phrase):
-        # Dictionary with field names to search in and priority rate as keys and list
-        # to store matches. Priority of search result display is sum of sum of matches
-        # in fields. Sum in fields is multiplied by priority rate.
-        fields = {("name", 1.0): [], ("producer", 1.2): []}
-
-        for word in phrase.split():
-            for key in fields.keys():
-                fields[key].append(
-                    Product.objects.all().filter(**{f"{key[0]}__icontains": word})
-                )
+        return self.results
+
+
+class AutocompleteView(View):
+    """Return JSON with product names and producers completing 'prefix' GET
+    parameter. Served from in memory index, no database queries unless products
+    changed."""
 
-        # Count match for each field, replace matches in fields dict to matches count.
-        # Count is multiplied by priority rate.
-        for key in fields.keys():
-            temp_dict = {}
-            result_l = list(chain.from_iterable(fields[key]))
-            for result in result_l:
-                temp_dict[result] = result_l.count(result) * key[1]
-            fields[key] = temp_dict
-
-        # Sum of counts for each object.
-        result = {}
-        for queryset in fields.values():
-            for key, value in queryset.items():
-                if key in result:
-                    result[key] += value
-                else:
-                    result[key] = value
-
-        # sorting dictionary by value
-        sorted_tuples = sorted(result.items(), key=lambda item: item[1], reverse=True)
-        sorted_dict = {k: v for k, v in sorted_tuples}
-
-        return sorted_dict.keys()
+    default_limit = 10
+    max_limit = 50
+
+    def get(self, request, *args, **kwargs):
+        prefix = request.GET.get("prefix", "")
+        try:
+            limit = min(int(request.GET["limit"]), self.max_limit)
+        except (KeyError, ValueError):
+            limit = self.default_limit
+        return JsonResponse(autocomplete.complete(prefix, limit))
 
 
 class CheckboxView(ListView):
@@ -1,5 +1,6 @@
 from django import forms
-from .models import CartItem
+from accounts.models import Address
+from .models import CartItem, Transaction
 
 
 class RadioForm(forms.Form):
@@ -33,3 +34,48 @@ class CartItemForm(forms.ModelForm):
     class Meta:
         model = CartItem
         fields = ("count",)
+
+
+class BaseCartItemFormSet(forms.BaseModelFormSet):
+    """Formset of cart's items. Built from items prefetched with cart, forms find
+    their items there, so the formset doesn't query database."""
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        # Model choice field of item's pk would be validated with query per item.
+        form.fields[self._pk_field.name] = forms.IntegerField(
+            initial=form.instance.pk, required=False, widget=forms.HiddenInput
+        )
+
+
+CartItemFormSet = forms.modelformset_factory(
+    CartItem, form=CartItemForm, formset=BaseCartItemFormSet, extra=0
+)
+
+
+class GuestCartItemForm(CartItemForm):
+    """Count of product in guest cart, validated like counts of cart items."""
+
+    product_pk = forms.UUIDField(widget=forms.HiddenInput)
+
+
+GuestCartItemFormSet = forms.formset_factory(GuestCartItemForm, extra=0)
+
+
+class GuestForm(forms.ModelForm):
+    """Contact data of not logged in user, saved with transaction."""
+
+    class Meta:
+        model = Transaction
+        fields = ("name", "surname", "email")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            field.required = True
+
+
+class GuestAddressForm(forms.ModelForm):
+    class Meta:
+        model = Address
+        fields = ("address", "city", "postal_code")
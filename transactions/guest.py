@@ -0,0 +1,136 @@
+from functools import partial
+
+from django.db import transaction
+
+from products.models import Product
+from products.signals import stock_changed
+
+from .models import add_cart_items
+from .reservations import reservation_expiry
+
+SESSION_KEY = "guest_cart"
+# Keeps session small.
+MAX_ITEMS = 100
+
+
+class GuestCart:
+    """Cart of not logged in user, kept in session as counts of products, so
+    visitors don't add rows to cart tables. Products are taken from stock only
+    when guest makes transaction, or logs in and cart is merged into user's cart.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    @property
+    def counts(self):
+        """Dict of product's pk and count."""
+        return dict(self.session.get(SESSION_KEY, {}))
+
+    def save(self, counts):
+        if counts:
+            self.session[SESSION_KEY] = counts
+        else:
+            self.session.pop(SESSION_KEY, None)
+
+    def __len__(self):
+        return len(self.session.get(SESSION_KEY, {}))
+
+    def add(self, product, quantity=1):
+        """Add product to cart, if there is enough in stock. Return errors."""
+        counts = self.counts
+        key = str(product.pk)
+        count = counts.get(key, 0) + quantity
+        if key not in counts and len(counts) >= MAX_ITEMS:
+            return [f"Cart can't have more than {MAX_ITEMS} products."]
+        if count > product.count:
+            return [f"Only {product.count} of {product.name} left."]
+        counts[key] = count
+        self.save(counts)
+        return []
+
+    def update(self, new_counts):
+        """Set counts of products, given in dict of product's pk and count, removing
+        products with count 0. Return errors."""
+        counts = self.counts
+        errors = []
+        products = Product.objects.filter(
+            pk__in=[pk for pk in new_counts if pk in counts]
+        )
+        for product in products:
+            key = str(product.pk)
+            count = new_counts[key]
+            if count <= 0:
+                del counts[key]
+            elif count > product.count:
+                errors.append(f"Only {product.count} of {product.name} left.")
+            else:
+                counts[key] = count
+        self.save(counts)
+        return errors
+
+    def remove(self, product_pk):
+        counts = self.counts
+        counts.pop(str(product_pk), None)
+        self.save(counts)
+
+    def clear(self):
+        self.save({})
+
+    def items(self):
+        """Return list of products in cart and their counts, by product's name."""
+        counts = self.counts
+        if not counts:
+            return []
+        products = Product.objects.filter(pk__in=counts).order_by("name")
+        return [(product, counts[str(product.pk)]) for product in products]
+
+    def summary(self):
+        """Summary shown in navigation, like transactions.summary's one."""
+        items = self.items()
+        return {
+            "cart_pk": None,
+            "items": len(items),
+            "price": sum(product.price * count for product, count in items),
+        }
+
+
+def take_stock(counts):
+    """Take products from stock, counts given in dict of product's pk and count.
+    Products are fetched and locked at once and written back with bulk update.
+    Return dict of products taken, limited by stock, and errors. Must be run in
+    transaction."""
+    products = Product.objects.filter(pk__in=counts).select_for_update().order_by("pk")
+    taken = dict()
+    errors = list()
+    for product in products:
+        count = min(counts[str(product.pk)], product.count)
+        if count < counts[str(product.pk)]:
+            errors.append(f"Only {product.count} of {product.name} left.")
+        if count > 0:
+            product.count -= count
+            taken[product] = count
+    Product.objects.bulk_update(taken, ["count"])
+    for product in taken:
+        transaction.on_commit(
+            partial(stock_changed.send, sender=Product, product_pk=product.pk)
+        )
+    return taken, errors
+
+
+def merge_guest_cart(session, user):
+    """Move products of guest cart into user's open cart, when guest logs in, with
+    one upsert for all of them. Return errors."""
+    counts = GuestCart(session).counts
+    if not counts:
+        return []
+    cart, created = user.carts.get_or_create(transaction=None)
+    with transaction.atomic():
+        taken, errors = take_stock(counts)
+        add_cart_items(
+            cart,
+            {product.pk: count for product, count in taken.items()},
+            reservation_expiry(),
+        )
+    GuestCart(session).clear()
+    return errors
@@ -0,0 +1,119 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from products.models import Product
+from transactions.models import CartItem
+from transactions.summary import invalidate_cart_summary
+from transactions.views import CartView
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark carts with given numbers of items: rendering of whole cart page, "
+        "building its formset and rendering navigation's cart dropdown. Reports p50 "
+        "and p95 latency and queries per run. Carts are created in transaction, "
+        "that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[1, 50, 500],
+            help="Numbers of items in carts.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Number of times every cart is rendered.",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat has to be positive.")
+
+        for size in options["sizes"]:
+            with transaction.atomic():
+                self.stdout.write(f"Cart of {size} items:")
+                request, cart = self.create_cart(size)
+                for name, render in (
+                    ("page", self.render_page),
+                    ("formset", self.build_formset),
+                    ("nav", self.render_nav),
+                ):
+                    self.stdout.write(
+                        self.format_report(
+                            name,
+                            self.benchmark(render, request, cart, options["repeat"]),
+                        )
+                    )
+                invalidate_cart_summary(request.user.pk)
+                transaction.set_rollback(True)
+
+    def create_cart(self, size):
+        """Create user with cart of size items, return request of the user and
+        the cart."""
+        user = get_user_model().objects.create(username="benchmark_cart_user")
+        cart = user.carts.create(transaction=None)
+        products = Product.objects.bulk_create(
+            Product(
+                name=f"Product {index}",
+                producer="Benchmark",
+                description="",
+                price=100 + index,
+                count=10,
+            )
+            for index in range(size)
+        )
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product=product, count=1) for product in products
+        )
+        invalidate_cart_summary(user.pk)
+        request = RequestFactory().get("/")
+        request.user = user
+        return request, cart
+
+    def render_page(self, request, cart):
+        CartView.as_view()(request, pk=cart.pk).render()
+
+    def build_formset(self, request, cart):
+        view = CartView(request=request, kwargs={"pk": cart.pk})
+        view.object = view.get_object()
+        view.get_formset().forms
+
+    def render_nav(self, request, cart):
+        render_to_string("user_nav.html", request=request)
+
+    def benchmark(self, render, request, cart, repeat):
+        """Return latencies in milliseconds and queries counts. First render isn't
+        counted, it fills caches."""
+        render(request, cart)
+        latencies, queries_counts = list(), list()
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                render(request, cart)
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries_counts.append(len(context.captured_queries))
+        return latencies, queries_counts
+
+    def format_report(self, name, results):
+        latencies, queries_counts = results
+        if len(latencies) > 1:
+            percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+            p50, p95 = percentiles[49], percentiles[94]
+        else:
+            p50 = p95 = latencies[0]
+        return (
+            f"  {name:<8} p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  "
+            f"queries {statistics.mean(queries_counts):4.1f}"
+        )
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.reservations import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = (
+        "Return products of cart items with expired reservations to stock, and "
+        "remove the items from abandoned carts. Many workers can run at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of cart items released in one transaction.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60.0,
+            help="Seconds to wait when no reservation is expired.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when no reservation is expired, instead of waiting.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size has to be positive.")
+
+        released = 0
+        while True:
+            count = release_expired_reservations(options["batch_size"])
+            released += count
+            if count:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(f"Released {released} cart items.")
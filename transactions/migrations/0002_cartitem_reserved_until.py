@@ -0,0 +1,26 @@
+# Generated by Django 4.1.13 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transactions", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cartitem",
+            name="reserved_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="cartitem",
+            index=models.Index(
+                condition=models.Q(("reserved_until__isnull", False)),
+                fields=["reserved_until"],
+                name="cartitem_reserved_until_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.1.13 on 2026-10-18 19:26
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    """Merge items of the same product in cart into the oldest one, so constraint
+    can be added."""
+    CartItem = apps.get_model("transactions", "CartItem")
+    duplicates = (
+        CartItem.objects.values("cart", "product")
+        .annotate(
+            items=Count("pk"),
+            first_pk=Min("pk"),
+            count_sum=Sum("count"),
+            reserved_until_max=Max("reserved_until"),
+        )
+        .filter(items__gt=1)
+    )
+    for duplicate in duplicates:
+        CartItem.objects.filter(pk=duplicate["first_pk"]).update(
+            count=duplicate["count_sum"],
+            reserved_until=duplicate["reserved_until_max"],
+        )
+        CartItem.objects.filter(
+            cart=duplicate["cart"], product=duplicate["product"]
+        ).exclude(pk=duplicate["first_pk"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transactions", "0002_cartitem_reserved_until"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.UniqueConstraint(
+                fields=("cart", "product"), name="cartitem_unique_cart_product"
+            ),
+        ),
+    ]
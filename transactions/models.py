@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import connection, models
+from django.db.models import F, Prefetch, Sum
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 
 from products.models import Product
@@ -27,8 +29,8 @@ class Transaction(models.Model):
 
 
 class Cart(models.Model):
-    # TODO Blank user only when transaction made, rest of the data filled from cookie
-    # then.
+    # Blank user only when guest made transaction, until then guest's cart is kept
+    # in session, see transactions.guest.
     user = models.ForeignKey(
         get_user_model(),
         on_delete=models.CASCADE,
@@ -46,6 +48,12 @@ class Cart(models.Model):
     )
 
 
+def cart_price():
+    """Price of cart's items counted in SQL, for annotating carts. Open cart's price
+    field is set from it only when transaction is made."""
+    return Coalesce(Sum(F("cart_items__product__price") * F("cart_items__count")), 0)
+
+
 class CartItem(models.Model):
     product = models.ForeignKey(
         Product,
@@ -60,3 +68,66 @@ class CartItem(models.Model):
         on_delete=models.CASCADE,
         related_name="cart_items",
     )
+    # Products are held in stock for cart until then, see transactions.reservations.
+    # Cleared when transaction is made, so index holds only open reservations.
+    reserved_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["reserved_until"],
+                name="cartitem_reserved_until_idx",
+                condition=models.Q(reserved_until__isnull=False),
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cart", "product"], name="cartitem_unique_cart_product"
+            ),
+        ]
+
+
+def cart_items_prefetch():
+    """Items of carts with their products, in order they were added, for prefetching
+    with carts."""
+    return Prefetch(
+        "cart_items", CartItem.objects.select_related("product").order_by("pk")
+    )
+
+
+def add_cart_items(cart, counts, reserved_until=None):
+    """Add products to cart, counts given in dict of product's pk and count, with
+    one INSERT ... ON CONFLICT DO UPDATE statement. Counts of products already in
+    cart are increased, so concurrent adds can't create duplicate items.
+
+    bulk_create(update_conflicts=True) can only set inserted values, not add them
+    to existing ones, so the statement is written here. PostgreSQL and SQLite
+    support it.
+    """
+    if not counts:
+        return
+    quote = connection.ops.quote_name
+    fields = [
+        CartItem._meta.get_field(name)
+        for name in ("cart", "product", "count", "reserved_until")
+    ]
+    table = quote(CartItem._meta.db_table)
+    cart_column, product_column, count_column, reserved_column = (
+        quote(field.column) for field in fields
+    )
+    rows = list()
+    params = list()
+    for product_pk, count in counts.items():
+        rows.append("(%s, %s, %s, %s)")
+        for field, value in zip(fields, (cart.pk, product_pk, count, reserved_until)):
+            params.append(field.get_db_prep_save(value, connection))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} "
+            f"({cart_column}, {product_column}, {count_column}, {reserved_column}) "
+            f"VALUES {', '.join(rows)} "
+            f"ON CONFLICT ({cart_column}, {product_column}) DO UPDATE SET "
+            f"{count_column} = {table}.{count_column} + EXCLUDED.{count_column}, "
+            f"{reserved_column} = EXCLUDED.{reserved_column}",
+            params,
+        )
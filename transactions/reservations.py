@@ -0,0 +1,56 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from products.models import Product
+from products.signals import stock_changed
+
+from .models import CartItem
+from .summary import invalidate_cart_summary
+
+
+def reservation_expiry():
+    """Return time until which products added to cart now are held in stock."""
+    return timezone.now() + timedelta(seconds=settings.CART_RESERVATION_TIMEOUT)
+
+
+def renew_reservations(cart):
+    """Hold products of cart in stock for another timeout, after cart was used."""
+    cart.cart_items.update(reserved_until=reservation_expiry())
+
+
+def release_expired_reservations(batch_size=1000):
+    """Return products of batch_size longest expired cart items to stock and remove
+    the items from carts. Return number of released items."""
+    with transaction.atomic():
+        # Locked items are released by other worker, or changed by their cart's
+        # owner right now.
+        items = list(
+            CartItem.objects.filter(reserved_until__lt=timezone.now())
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("reserved_until")
+            .values_list("pk", "product_id", "count", "cart__user_id")[:batch_size]
+        )
+        if not items:
+            return 0
+        returned = defaultdict(int)
+        for pk, product_pk, count, user_pk in items:
+            returned[product_pk] += count
+        # One set based update for whole batch.
+        Product.objects.filter(pk__in=returned).update(
+            count=F("count")
+            + Case(
+                *[When(pk=pk, then=Value(count)) for pk, count in returned.items()],
+                default=Value(0),
+            )
+        )
+        CartItem.objects.filter(pk__in=[item[0] for item in items]).delete()
+    for product_pk in returned:
+        stock_changed.send(sender=Product, product_pk=product_pk)
+    for user_pk in {item[3] for item in items} - {None}:
+        invalidate_cart_summary(user_pk)
+    return len(items)
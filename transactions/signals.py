@@ -0,0 +1,25 @@
+from django.contrib import messages
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .guest import merge_guest_cart
+from .models import Cart
+from .summary import invalidate_cart_summary
+
+
+@receiver(post_delete, sender=Cart)
+def invalidate_deleted_cart_summary(sender, instance, **kwargs):
+    """Forget summary of cart deleted outside of cart views, e.g. in admin."""
+    if instance.user_id is not None:
+        invalidate_cart_summary(instance.user_id)
+
+
+@receiver(user_logged_in)
+def merge_guest_cart_on_login(sender, request, user, **kwargs):
+    """Keep products guest added to cart before logging in."""
+    if request is None or not hasattr(request, "session"):
+        return
+    for error in merge_guest_cart(request.session, user):
+        messages.error(request, error, fail_silently=True)
+    invalidate_cart_summary(user.pk)
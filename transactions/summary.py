@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Cart, cart_price
+
+
+def summary_key(user_pk):
+    return f"transactions:cart_summary:{user_pk}"
+
+
+def count_cart_summary(cart):
+    """Return summary of cart shown in navigation: cart's pk, number of items,
+    price and time of last modification."""
+    summary = (
+        Cart.objects.filter(pk=cart.pk)
+        .annotate(items=Count("cart_items"), price_sum=cart_price())
+        .values("items", "price_sum")
+        .get()
+    )
+    return {
+        "cart_pk": cart.pk,
+        "items": summary["items"],
+        "price": summary["price_sum"],
+        "modified": timezone.now(),
+    }
+
+
+def update_cart_summary(cart):
+    """Store summary of user's open cart, after cart changed."""
+    summary = count_cart_summary(cart)
+    cache.set(summary_key(cart.user_id), summary, settings.CART_SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_cart_summary(user_pk):
+    """Forget summary of user's open cart, e.g. when it's closed by transaction.
+    It's counted again for user's next open cart."""
+    cache.delete(summary_key(user_pk))
+
+
+def get_cart_summary(user):
+    """Return summary of user's open cart, from cache or counted in database on
+    miss."""
+    summary = cache.get(summary_key(user.pk))
+    if summary is None:
+        cart, created = user.carts.get_or_create(transaction=None)
+        summary = update_cart_summary(cart)
+    return summary
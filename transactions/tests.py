@@ -1,9 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.db.models import Sum
+from django.template import RequestContext, Template
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+from django.test import RequestFactory, TestCase, TransactionTestCase
 from django.urls import reverse
+from django.utils import timezone
 from products.models import Product
 from .views import TransactionView, CartView, TransactionsUserListView
-from .models import Transaction
+from .models import Cart, CartItem, Transaction, add_cart_items
+from .context_processors import cart as cart_context_processor
+from .guest import SESSION_KEY as GUEST_SESSION_KEY
+from .summary import get_cart_summary, invalidate_cart_summary
+
+
+def cart_formset_data(counts, **buttons):
+    """POST data of cart's formset, counts given in list of cart item and count."""
+    data = {"form-TOTAL_FORMS": len(counts), "form-INITIAL_FORMS": len(counts)}
+    for index, (cart_item, count) in enumerate(counts):
+        data[f"form-{index}-id"] = cart_item.pk
+        data[f"form-{index}-count"] = count
+    data.update(buttons)
+    return data
 
 
 class CartViewTest(TestCase):
@@ -80,10 +106,7 @@ class CartViewTest(TestCase):
     def test_delete_product_from_cart(self):
         response = self.client.post(
             reverse("cart_details", kwargs={"pk": self.cart.pk}),
-            data={
-                "cart_item_pk": self.cart_item1.pk,
-                "delete_button": "delete",
-            },
+            data={"delete_button": self.cart_item1.pk},
         )
         self.assertEqual(response.status_code, 302)
         response = self.client.get(reverse("cart_details", kwargs={"pk": self.cart.pk}))
@@ -96,11 +119,7 @@ class CartViewTest(TestCase):
     def test_change_product_count(self):
         response = self.client.post(
             reverse("cart_details", kwargs={"pk": self.cart.pk}),
-            data={
-                "cart_item_pk": self.cart_item1.pk,
-                "save_button": "save",
-                "count": 150,
-            },
+            data=cart_formset_data([(self.cart_item1, 150)], save_button="save"),
         )
         self.assertEqual(response.status_code, 302)
         self.cart_item1.refresh_from_db()
@@ -112,25 +131,61 @@ class CartViewTest(TestCase):
     def test_exceed_product_count(self):
         response = self.client.post(
             reverse("cart_details", kwargs={"pk": self.cart.pk}),
-            data={
-                "cart_item_pk": self.cart_item1.pk,
-                "save_button": "save",
-                "count": 1500,
-            },
+            data=cart_formset_data([(self.cart_item1, 1500)], save_button="save"),
         )
         self.assertEqual(response.status_code, 302)
         self.cart_item1.refresh_from_db()
         self.assertEqual(self.cart_item1.count, 1)
         self.assertEqual(self.cart_item1.product.count, 1000)
 
+    def post_counts(self, cart_items, count):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                reverse("cart_details", kwargs={"pk": self.cart.pk}),
+                data=cart_formset_data(
+                    [(cart_item, count) for cart_item in cart_items], save_button="save"
+                ),
+            )
+        return len(queries)
+
+    def test_save_queries_independent_of_items_count(self):
+        few_items_queries = self.post_counts([self.cart_item1], 2)
+        for index in range(30):
+            product = Product.objects.create(
+                name=f"product{index}", producer="test_producer", price=1, count=10
+            )
+            self.cart.cart_items.create(product=product, count=1)
+        cart_items = list(self.cart.cart_items.exclude(pk=self.cart_item1.pk))
+        self.assertEqual(self.post_counts(cart_items, 3), few_items_queries)
+        self.assertEqual(
+            sorted(set(self.cart.cart_items.values_list("count", flat=True))),
+            [2, 3],
+        )
+        self.assertEqual(Product.objects.get(name="product0").count, 8)
+
+    def get_cart_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("cart_details", kwargs={"pk": self.cart.pk})
+            )
+        return response, len(queries)
+
+    def test_render_queries_independent_of_items_count(self):
+        response, few_items_queries = self.get_cart_queries()
+        for index in range(30):
+            product = Product.objects.create(
+                name=f"product{index}", producer="test_producer", price=1, count=10
+            )
+            self.cart.cart_items.create(product=product, count=1)
+        response, queries = self.get_cart_queries()
+        self.assertEqual(queries, few_items_queries)
+        self.assertEqual(len(response.context["formset"].forms), 33)
+        self.assertContains(response, "product29")
+
     def test_proceed_to_payment(self):
         response = self.client.post(
             reverse("cart_details", kwargs={"pk": self.cart.pk}),
-            data={
-                "cart_item_pk": self.cart_item1.pk,
-                "buy_button": "buy",
-                "count": 150,
-            },
+            data=cart_formset_data([(self.cart_item1, 150)], buy_button="buy"),
             follow=True,
         )
         self.assertEqual(response.status_code, 200)
@@ -300,6 +355,15 @@ class TransactionViewTest(TestCase):
     def test_transaction_created(self):
         self.assertEqual(Transaction.objects.count(), 1)
 
+    def test_price_saved_with_transaction(self):
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.price, 100 + 2 * 200 + 5 * 300)
+
+    def test_cart_summary_of_new_cart(self):
+        summary = get_cart_summary(self.casual_user)
+        self.assertNotEqual(summary["cart_pk"], self.cart.pk)
+        self.assertEqual((summary["items"], summary["price"]), (0, 0))
+
 
 class TransactionsUserListViewTest(TestCase):
     def setUp(self):
@@ -410,3 +474,479 @@ class TransactionsUserListViewTest(TestCase):
         self.assertContains(self.response, "Shipping Method")
         self.assertContains(self.response, self.transaction.shipping_method)
         self.assertContains(self.response, self.transaction2.shipping_method)
+
+
+class CartContextProcessorTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="testuser")
+        cart = self.user.carts.create(transaction=None)
+        product = Product.objects.create(
+            name="product_name", producer="test_producer", price=100, count=10
+        )
+        cart.cart_items.create(product=product, count=3)
+        # Summary of user with the same pk from other test.
+        invalidate_cart_summary(self.user.pk)
+        self.request = RequestFactory().get("/")
+        self.request.user = self.user
+
+    def render(self, template):
+        return Template(template).render(RequestContext(self.request))
+
+    def test_no_queries_on_page_without_cart(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.render("{% if user.is_authenticated %}Hi{% endif %}"), "Hi"
+            )
+
+    def test_summary_loaded_once(self):
+        context = cart_context_processor(self.request)
+        self.assertEqual(context["cart_summary"]["items"], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(context["cart_summary"]["price"], 300)
+            # Cached for next pages.
+            self.assertEqual(self.render("{{ cart_summary.price }}"), "300")
+
+    def test_anonymous_user(self):
+        self.request.user = AnonymousUser()
+        self.request.session = {}
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render("{{ cart_summary.items }}"), "0")
+
+    def test_price_counted_without_writes(self):
+        self.client.force_login(self.user)
+        cart = self.user.carts.get()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("cart_details", kwargs={"pk": cart.pk}))
+        self.assertContains(response, "Price: $3,00", count=2)
+        self.assertFalse(
+            [
+                query["sql"]
+                for query in queries
+                if not query["sql"].startswith(("SELECT", "SAVEPOINT", "RELEASE"))
+            ]
+        )
+        cart.refresh_from_db()
+        self.assertIsNone(cart.price)
+
+
+class CartSummaryTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="testuser")
+        self.cart = self.user.carts.create(transaction=None)
+        self.product = Product.objects.create(
+            name="product_name", producer="test_producer", price=100, count=10
+        )
+        # Summary of user with the same pk from other test.
+        invalidate_cart_summary(self.user.pk)
+        self.request = RequestFactory().get("/")
+        self.request.user = self.user
+
+    def test_count_on_miss(self):
+        self.cart.cart_items.create(product=self.product, count=3)
+        summary = get_cart_summary(self.user)
+        self.assertEqual(
+            (summary["cart_pk"], summary["items"], summary["price"]),
+            (self.cart.pk, 1, 300),
+        )
+
+    def test_navigation_without_queries(self):
+        get_cart_summary(self.user)
+        with self.assertNumQueries(0):
+            html = render_to_string("user_nav.html", request=self.request)
+        self.assertIn("No products in cart.", html)
+
+    def test_updated_on_cart_change(self):
+        get_cart_summary(self.user)
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse("product_details", kwargs={"pk": self.product.pk}),
+            data={"cart_add_button": "Add to cart"},
+        )
+        summary = get_cart_summary(self.user)
+        self.assertEqual((summary["items"], summary["price"]), (1, 100))
+        html = render_to_string("user_nav.html", request=self.request)
+        self.assertIn("1 product in cart.", html)
+        self.assertIn("Price: $1,00", html)
+
+        item = self.cart.cart_items.get()
+        self.client.post(
+            reverse("cart_details", kwargs={"pk": self.cart.pk}),
+            data={"delete_button": item.pk},
+        )
+        self.assertEqual(get_cart_summary(self.user)["items"], 0)
+
+
+class StockReservationTest(TransactionTestCase):
+    stock = 20
+    users_count = 8
+    adds_per_user = 5
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="product_name", producer="test_producer", price=100, count=self.stock
+        )
+        self.users = [
+            get_user_model().objects.create(username=f"testuser{index}")
+            for index in range(self.users_count)
+        ]
+        for user in self.users:
+            user.carts.create(transaction=None)
+            invalidate_cart_summary(user.pk)
+
+    def add_to_cart(self, user):
+        try:
+            client = self.client_class()
+            client.force_login(user)
+            for _ in range(self.adds_per_user):
+                client.post(
+                    reverse("product_details", kwargs={"pk": self.product.pk}),
+                    data={"cart_add_button": "Add to cart"},
+                )
+        finally:
+            connections.close_all()
+
+    def test_stock_conserved_under_concurrent_adds(self):
+        if connection.vendor == "sqlite":
+            self.skipTest("SQLite test database locks tables on concurrent writes.")
+        with ThreadPoolExecutor(max_workers=self.users_count) as executor:
+            list(executor.map(self.add_to_cart, self.users))
+
+        self.product.refresh_from_db()
+        in_carts = CartItem.objects.aggregate(count=Sum("count"))["count"]
+        # More products were requested than there is, all of them are in carts.
+        self.assertEqual(self.product.count, 0)
+        self.assertEqual(in_carts, self.stock)
+
+    def test_out_of_stock_reported(self):
+        Product.objects.filter(pk=self.product.pk).update(count=0)
+        cart = self.users[0].carts.get()
+        self.client.force_login(self.users[0])
+        self.client.post(
+            reverse("product_details", kwargs={"pk": self.product.pk}),
+            data={"cart_add_button": "Add to cart"},
+        )
+        self.assertFalse(cart.cart_items.exists())
+        response = self.client.get(reverse("cart_details", kwargs={"pk": cart.pk}))
+        self.assertContains(response, "product_name is out of stock.")
+
+
+class ReservationTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="testuser")
+        self.other_user = get_user_model().objects.create(username="otheruser")
+        self.cart = self.user.carts.create(transaction=None)
+        self.other_cart = self.other_user.carts.create(transaction=None)
+        self.product = Product.objects.create(
+            name="product_name", producer="test_producer", price=100, count=10
+        )
+        self.expired = timezone.now() - timedelta(minutes=1)
+
+    def test_add_to_cart_reserves(self):
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse("product_details", kwargs={"pk": self.product.pk}),
+            data={"cart_add_button": "Add to cart"},
+        )
+        self.assertGreater(self.cart.cart_items.get().reserved_until, timezone.now())
+
+    def test_expired_reservations_released(self):
+        self.cart.cart_items.create(
+            product=self.product, count=2, reserved_until=self.expired
+        )
+        self.other_cart.cart_items.create(
+            product=self.product, count=3, reserved_until=self.expired
+        )
+        other_product = Product.objects.create(
+            name="other_product", producer="test_producer", price=100, count=10
+        )
+        reserved = self.other_cart.cart_items.create(
+            product=other_product,
+            count=1,
+            reserved_until=timezone.now() + timedelta(minutes=1),
+        )
+        # Sold, so not reserved.
+        sold = Cart.objects.create().cart_items.create(product=self.product, count=4)
+
+        out = StringIO()
+        call_command("release_reservations", once=True, batch_size=1, stdout=out)
+        self.assertIn("Released 2 cart items.", out.getvalue())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 10 + 2 + 3)
+        self.assertCountEqual(CartItem.objects.all(), [reserved, sold])
+
+    def buy(self):
+        self.client.force_login(self.user)
+        return self.client.post(
+            reverse("transaction", kwargs={"pk": self.cart.pk}),
+            data={
+                "first_name": "Name",
+                "last_name": "Surname",
+                "radio_address": "new",
+                "address": "Test st. 12",
+                "city": "Test City",
+                "postal_code": "11-111",
+                "radio_shipping": "UPS",
+                "radio_payment": "cash on delivery",
+                "proceed_to_payment_button": "Proceed to payment",
+                "user": self.user.pk,
+            },
+        )
+
+    def test_buy_with_expired_reservation_refused(self):
+        self.cart.cart_items.create(
+            product=self.product, count=2, reserved_until=self.expired
+        )
+        response = self.buy()
+        self.assertRedirects(
+            response,
+            reverse("cart_details", kwargs={"pk": self.cart.pk}),
+            fetch_redirect_response=False,
+        )
+        self.assertFalse(Transaction.objects.exists())
+        self.cart.refresh_from_db()
+        self.assertIsNone(self.cart.transaction)
+        response = self.client.get(response.url)
+        self.assertContains(response, "Reservation of products in cart expired")
+
+    def test_buy_of_empty_cart_refused(self):
+        response = self.buy()
+        self.assertRedirects(
+            response, reverse("cart_details", kwargs={"pk": self.cart.pk})
+        )
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_buy_ends_reservation(self):
+        item = self.cart.cart_items.create(
+            product=self.product,
+            count=2,
+            reserved_until=timezone.now() + timedelta(minutes=1),
+        )
+        self.buy()
+        self.cart.refresh_from_db()
+        self.assertIsNotNone(self.cart.transaction)
+        item.refresh_from_db()
+        self.assertIsNone(item.reserved_until)
+
+
+class GuestCartTest(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="product_name", producer="test_producer", price=100, count=10
+        )
+
+    def add_to_cart(self):
+        self.client.post(
+            reverse("product_details", kwargs={"pk": self.product.pk}),
+            data={"cart_add_button": "Add to cart"},
+        )
+
+    def test_add_to_cart_kept_in_session(self):
+        self.add_to_cart()
+        self.add_to_cart()
+        self.assertEqual(
+            self.client.session[GUEST_SESSION_KEY], {str(self.product.pk): 2}
+        )
+        self.assertFalse(Cart.objects.exists())
+        # Guest cart doesn't take products from stock.
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 10)
+
+    def test_guest_cart_kept_after_cache_clear(self):
+        self.add_to_cart()
+        cache.clear()
+        response = self.client.get(reverse("guest_cart"))
+        self.assertContains(response, "product_name")
+
+    def test_guest_cart_page(self):
+        self.add_to_cart()
+        response = self.client.get(reverse("guest_cart"))
+        self.assertContains(response, "product_name")
+        self.assertEqual(response.context["price"], 100)
+
+        self.client.post(reverse("guest_cart"), data={"delete_button": self.product.pk})
+        self.assertNotIn(GUEST_SESSION_KEY, self.client.session)
+
+    def post_guest_counts(self, counts, **buttons):
+        data = {"form-TOTAL_FORMS": len(counts), "form-INITIAL_FORMS": len(counts)}
+        for index, (product, count) in enumerate(counts):
+            data[f"form-{index}-product_pk"] = product.pk
+            data[f"form-{index}-count"] = count
+        data.update(buttons)
+        return self.client.post(reverse("guest_cart"), data=data, follow=True)
+
+    def test_guest_cart_counts_saved(self):
+        self.add_to_cart()
+        self.post_guest_counts([(self.product, 4)], save_button="Save")
+        self.assertEqual(
+            self.client.session[GUEST_SESSION_KEY], {str(self.product.pk): 4}
+        )
+
+    def test_guest_cart_invalid_count(self):
+        self.add_to_cart()
+        response = self.post_guest_counts([(self.product, "many")], buy_button="Buy")
+        self.assertRedirects(response, reverse("guest_cart"))
+        self.assertContains(response, "Count of product has to be a number.")
+        self.assertEqual(
+            self.client.session[GUEST_SESSION_KEY], {str(self.product.pk): 1}
+        )
+
+    def test_guest_transaction(self):
+        self.add_to_cart()
+        response = self.client.post(
+            reverse("guest_transaction"),
+            data={
+                "name": "guest_name",
+                "surname": "guest_surname",
+                "email": "guest@example.com",
+                "address": "test_address",
+                "city": "test_city",
+                "postal_code": "00-000",
+                "radio_shipping": "UPS",
+                "radio_payment": "cash on delivery",
+                "proceed_to_payment_button": "",
+            },
+        )
+        self.assertRedirects(response, reverse("home"), fetch_redirect_response=False)
+        transaction = Transaction.objects.get()
+        self.assertEqual(transaction.email, "guest@example.com")
+        self.assertEqual(transaction.status, "pending for shipping")
+        cart = transaction.cart
+        self.assertIsNone(cart.user)
+        self.assertEqual(cart.price, 100)
+        self.assertEqual(cart.cart_items.get().count, 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 9)
+        self.assertNotIn(GUEST_SESSION_KEY, self.client.session)
+
+    def test_empty_guest_cart_transaction_redirects(self):
+        response = self.client.get(reverse("guest_transaction"))
+        self.assertRedirects(response, reverse("guest_cart"))
+
+    def test_guest_cart_merged_on_login(self):
+        user = get_user_model().objects.create(username="testuser")
+        invalidate_cart_summary(user.pk)
+        cart = user.carts.create(transaction=None)
+        cart.cart_items.create(product=self.product, count=1)
+        self.product.count = 9
+        self.product.save()
+        self.add_to_cart()
+        self.add_to_cart()
+
+        self.client.force_login(user)
+        self.assertEqual(cart.cart_items.get().count, 3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 7)
+        self.assertNotIn(GUEST_SESSION_KEY, self.client.session)
+        self.assertEqual(get_cart_summary(user)["items"], 1)
+
+
+class CartAddViewTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="testuser")
+        invalidate_cart_summary(self.user.pk)
+        self.cart = self.user.carts.create(transaction=None)
+        self.product = Product.objects.create(
+            name="product_name", producer="test_producer", price=100, count=2
+        )
+        self.url = reverse("cart_add", kwargs={"product_pk": self.product.pk})
+
+    def test_add_returns_delta(self):
+        self.client.force_login(self.user)
+        self.client.post(self.url)
+        data = self.client.post(self.url).json()
+        self.assertEqual(data["errors"], [])
+        self.assertEqual(data["item"], {"product_pk": str(self.product.pk), "count": 2})
+        self.assertEqual(data["cart"], {"items": 1, "price": 200})
+        self.assertIn('id="cart_summary"', data["html"])
+        self.assertIn(
+            reverse("cart_details", kwargs={"pk": self.cart.pk}), data["html"]
+        )
+        self.assertEqual(get_cart_summary(self.user)["price"], 200)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 0)
+
+    def test_add_out_of_stock(self):
+        self.client.force_login(self.user)
+        self.client.post(self.url)
+        self.client.post(self.url)
+        data = self.client.post(self.url).json()
+        self.assertEqual(data["errors"], ["product_name is out of stock."])
+        self.assertEqual(data["item"]["count"], 2)
+
+    def test_add_few_queries(self):
+        self.client.force_login(self.user)
+        self.client.post(self.url)
+        # Session and user, cart, product, stock, item upsert, reservations and
+        # summary; no listing or whole cart is loaded.
+        with self.assertNumQueries(10):
+            self.client.post(self.url)
+
+    def test_guest_add(self):
+        data = self.client.post(self.url).json()
+        self.assertEqual(data["item"]["count"], 1)
+        self.assertEqual(data["cart"], {"items": 1, "price": 100})
+        self.assertIn(reverse("guest_cart"), data["html"])
+        self.assertEqual(
+            self.client.session[GUEST_SESSION_KEY], {str(self.product.pk): 1}
+        )
+
+    def test_get_not_allowed(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+
+class CartItemUpsertTest(TransactionTestCase):
+    clicks = 8
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="testuser")
+        invalidate_cart_summary(self.user.pk)
+        self.cart = self.user.carts.create(transaction=None)
+        self.product = Product.objects.create(
+            name="product_name", producer="test_producer", price=100, count=20
+        )
+
+    def test_add_cart_items_increases_count(self):
+        add_cart_items(self.cart, {self.product.pk: 2})
+        add_cart_items(self.cart, {self.product.pk: 3})
+        self.assertEqual(self.cart.cart_items.get().count, 5)
+
+    def test_duplicate_item_rejected(self):
+        self.cart.cart_items.create(product=self.product, count=1)
+        with self.assertRaises(IntegrityError):
+            self.cart.cart_items.create(product=self.product, count=1)
+
+    def click_add_to_cart(self, index):
+        try:
+            client = self.client_class()
+            client.force_login(self.user)
+            return client.post(
+                reverse("cart_add", kwargs={"product_pk": self.product.pk})
+            ).json()["errors"]
+        finally:
+            connections.close_all()
+
+    def test_concurrent_adds_make_one_item(self):
+        if connection.vendor == "sqlite":
+            self.skipTest("SQLite test database locks tables on concurrent writes.")
+        with ThreadPoolExecutor(max_workers=self.clicks) as executor:
+            errors = list(executor.map(self.click_add_to_cart, range(self.clicks)))
+
+        self.assertEqual(errors, [[]] * self.clicks)
+        self.assertEqual(self.cart.cart_items.get().count, self.clicks)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 20 - self.clicks)
+
+
+class BenchmarkCartCommandTest(TestCase):
+    def test_benchmark(self):
+        out = StringIO()
+        call_command("benchmark_cart", sizes=[1, 20], repeat=2, stdout=out)
+        report = out.getvalue()
+        self.assertIn("Cart of 20 items:", report)
+        for name in ("page", "formset", "nav"):
+            self.assertIn(f"  {name} ", report)
+        # Queries don't depend on number of items, nav is served from cache.
+        self.assertEqual(report.count("queries  3.0"), 4)
+        self.assertEqual(report.count("queries  0.0"), 2)
+        # Carts are rolled back.
+        self.assertFalse(CartItem.objects.exists())
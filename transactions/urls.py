@@ -1,6 +1,9 @@
 from django.urls import path
 from .views import (
+    CartAddView,
     CartView,
+    GuestCartView,
+    GuestTransactionView,
     TransactionView,
     TransactionsUserListView,
 )
@@ -16,6 +19,21 @@ urlpatterns = [
         CartView.as_view(),
         name="cart_details",
     ),
+    path(
+        "cart/add/<uuid:product_pk>",
+        CartAddView.as_view(),
+        name="cart_add",
+    ),
+    path(
+        "cart/guest",
+        GuestCartView.as_view(),
+        name="guest_cart",
+    ),
+    path(
+        "transaction/guest",
+        GuestTransactionView.as_view(),
+        name="guest_transaction",
+    ),
     path(
         "transaction/<int:pk>",
         TransactionView.as_view(),
@@ -1,11 +1,17 @@
 from datetime import datetime
-from django.http import HttpResponseRedirect, Http404
+from django.http import HttpResponseRedirect, Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils import timezone
 from django.views.generic import (
     ListView,
     TemplateView,
     UpdateView,
+    View,
 )
+from django.contrib import messages
+from django.db import transaction
 from django.db.models import Prefetch
 from django.contrib.auth.mixins import (
     LoginRequiredMixin,
@@ -13,12 +19,28 @@ from django.contrib.auth.mixins import (
 
 from accounts.views import AddressCreate
 from accounts.forms import CustomUserNameForm
-from .models import Cart, CartItem, Transaction
+from .models import (
+    Cart,
+    CartItem,
+    Transaction,
+    add_cart_items,
+    cart_items_prefetch,
+    cart_price,
+)
+from .reservations import renew_reservations, reservation_expiry
+from .summary import invalidate_cart_summary, update_cart_summary
 from products.models import Product
+from products.signals import stock_changed
+from products.stock import change_stock
 from .forms import (
     CartItemForm,
+    CartItemFormSet,
+    GuestAddressForm,
+    GuestCartItemFormSet,
+    GuestForm,
     RadioForm,
 )
+from .guest import GuestCart, take_stock
 from accounts.utils.utils import StaffPrivilegesRequiredMixin
 
 
@@ -49,35 +71,38 @@ class ObjectOwnershipRequiredMixin:
 
 class CartView(LoginRequiredMixin, ObjectOwnershipRequiredMixin, UpdateView):
     """
-    Cart view for get and post form for Cart model. Template context cart data is
-    fetched from db through context processor 'cart', so only forms are added to the
-    context.
+    Cart view for get and post form for Cart model. Cart is fetched with its items
+    and their products, which are rendered and read with one formset.
     """
 
     template_name = "transactions/cart_details.html"
     form_class = CartItemForm
     model = Cart
 
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .annotate(current_price=cart_price())
+            .prefetch_related(cart_items_prefetch())
+        )
+
     def get(self, request, *args, **kwargs):
         self.object = self.get_object()
+        self.object.price = self.object.current_price
 
-        kwargs["forms"] = self.get_forms()
+        kwargs["formset"] = self.get_formset()
 
         return self.render_to_response(self.get_context_data(**kwargs))
 
-    def get_forms(self, object=None):
+    def get_formset(self, data=None, object=None):
+        """Formset of cart's items. Items have to be prefetched with cart, see
+        cart_items_prefetch, otherwise they are queried."""
         if object is None:
             if self.object is None:
                 raise ValueError("object can't be None value.s")
             object = self.object
-
-        forms = list()
-        for cart_item in object.cart_items.all():
-            # set initial for each cart item form
-            self.initial = {"count": cart_item.count}
-            form = self.get_form()
-            forms.append(form)
-        return forms
+        return CartItemFormSet(data, queryset=object.cart_items.all())
 
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()
@@ -87,83 +112,197 @@ class CartView(LoginRequiredMixin, ObjectOwnershipRequiredMixin, UpdateView):
         ), "Cart can't have assigned transaction in order to edit"
         cart_pk = kwargs.get("pk")
 
-        # TODO message errors
         errors = list()
 
         if "delete_button" in request.POST:
-            # delete cart item
-            cart_item = self.object.cart_items.get(pk=request.POST["cart_item_pk"])
+            # delete cart item, button's value is its pk
+            cart_item = self.object.cart_items.get(pk=request.POST["delete_button"])
             self.cart_item_delete(cart_item)
         elif "cart_add_button" in request.POST:
             # button placed in other templates
             product = Product.objects.get(pk=kwargs["product_pk"])
-            if product.pk in self.object.cart_items.values_list("product", flat=True):
-                cart_item = self.object.cart_items.get(product=product)
-                self.cart_item_update(cart_item, cart_item.count + 1)
-            else:
-                cart_item = CartItem.objects.create(product=product, cart=self.object)
-                self.cart_item_update(cart_item, cart_item.count + 1)
+            errors += self.cart_add(product)
         elif "save_button" in request.POST or "buy_button" in request.POST:
             # set new item count if changed
-            counts = list(map(int, request.POST.getlist("count")))
-            cart_item_pks = request.POST.getlist("cart_item_pk")
-            queryset = self.object.cart_items.filter(pk__in=cart_item_pks)
-            for pk, count in zip(cart_item_pks, counts):
-                cart_item = queryset.get(pk=pk)
-                self.cart_item_update(cart_item, count)
-
-            if "buy_button" in request.POST:
-                # redirect to transaction view
-                return HttpResponseRedirect(
-                    reverse("transaction", kwargs={"pk": cart_pk})
-                )
+            formset = self.get_formset(request.POST)
+            if formset.is_valid():
+                counts = {
+                    form.instance.pk: form.cleaned_data["count"]
+                    for form in formset
+                    if form.instance.pk is not None
+                }
+                errors += self.cart_items_update(counts)
+            else:
+                errors.append("Count of product has to be a number.")
+
+        renew_reservations(self.object)
+        update_cart_summary(self.object)
+        for error in errors:
+            messages.error(request, error)
+
+        if "buy_button" in request.POST:
+            # redirect to transaction view
+            return HttpResponseRedirect(reverse("transaction", kwargs={"pk": cart_pk}))
 
         return HttpResponseRedirect(reverse("cart_details", kwargs={"pk": cart_pk}))
 
+    def cart_add(self, product):
+        """Add one product to cart, if it's in stock. Count of product's item is
+        increased in the same statement that inserts it, so concurrent adds can't
+        create duplicate items."""
+        with transaction.atomic():
+            if not change_stock(product.pk, 1):
+                return [f"{product.name} is out of stock."]
+            add_cart_items(self.object, {product.pk: 1}, reservation_expiry())
+        return []
+
     def cart_item_delete(self, cart_item):
-        """Delete cart item."""
-        cart_item.product.count += cart_item.count
-        cart_item.product.save()
-        cart_item.delete()
-
-    def cart_item_update(self, cart_item, update_value):
-        """Update cart item by update_value value."""
-        difference = update_value - cart_item.count
-        # TODO message errors
+        """Delete cart item, returning its products to stock."""
+        with transaction.atomic():
+            # Count locked, so concurrent requests return it to stock once.
+            count = (
+                CartItem.objects.select_for_update()
+                .filter(pk=cart_item.pk)
+                .values_list("count", flat=True)
+                .first()
+            )
+            if count is not None:
+                CartItem.objects.filter(pk=cart_item.pk).delete()
+                change_stock(cart_item.product_id, -count)
+
+    def cart_items_update(self, counts):
+        """Set counts of cart items, given in dict of cart item's pk and count.
+        Items and their products are fetched and locked at once, changed in memory
+        and written back with bulk updates in one transaction."""
         errors = []
-        if update_value == 0:
-            self.cart_item_delete(cart_item)
-        elif difference > 0:
-            if cart_item.product.count >= difference:
-                cart_item.count = update_value
-                cart_item.product.count -= difference
-                cart_item.save()
-                cart_item.product.save()
-            else:
-                errors.append(f"Only {cart_item.product.count} left.")
-        elif difference < 0:
-            cart_item.count = update_value
-            cart_item.product.count -= difference
-            cart_item.save()
-            cart_item.product.save()
-        elif difference == 0:
-            pass
+        with transaction.atomic():
+            cart_items = (
+                self.object.cart_items.filter(pk__in=counts)
+                .select_related("product")
+                .select_for_update()
+                .order_by("pk")
+            )
+            products = dict()
+            updated_items = list()
+            deleted_items = list()
+            for cart_item in cart_items:
+                count = counts[cart_item.pk]
+                if count == cart_item.count:
+                    continue
+                # Items of the same product share its stock.
+                product = products.setdefault(cart_item.product_id, cart_item.product)
+                if count <= 0:
+                    product.count += cart_item.count
+                    deleted_items.append(cart_item.pk)
+                elif count - cart_item.count > product.count:
+                    errors.append(f"Only {product.count} of {product.name} left.")
+                    continue
+                else:
+                    product.count -= count - cart_item.count
+                    cart_item.count = count
+                    updated_items.append(cart_item)
+            CartItem.objects.bulk_update(updated_items, ["count"])
+            Product.objects.bulk_update(products.values(), ["count"])
+            CartItem.objects.filter(pk__in=deleted_items).delete()
+        for product_pk in products:
+            stock_changed.send(sender=Product, product_pk=product_pk)
+        return errors
+
+
+def add_to_cart(request, product_pk):
+    """Add product to cart of user, or to guest cart of not logged in visitor."""
+    if request.user.is_authenticated:
+        cart, created = request.user.carts.get_or_create(transaction=None)
+        return CartView.as_view()(request, pk=cart.pk, product_pk=product_pk)
+    product = get_object_or_404(Product, pk=product_pk)
+    for error in GuestCart(request.session).add(product):
+        messages.error(request, error)
+
+
+class CartAddView(View):
+    """Add one product to cart of user or guest and return only what changed, as
+    JSON: product's count in cart and cart in navigation. Add to cart buttons use it
+    instead of posting and rendering whole page again, see _base.html."""
+
+    http_method_names = ["post"]
+
+    def post(self, request, *args, **kwargs):
+        product = get_object_or_404(
+            Product.objects.only("name", "price", "count"), pk=kwargs["product_pk"]
+        )
+        if request.user.is_authenticated:
+            cart, created = request.user.carts.get_or_create(transaction=None)
+            errors = CartView(object=cart, request=request).cart_add(product)
+            renew_reservations(cart)
+            summary = update_cart_summary(cart)
+            count = (
+                cart.cart_items.filter(product=product)
+                .values_list("count", flat=True)
+                .first()
+            )
+            cart_url = reverse("cart_details", kwargs={"pk": cart.pk})
         else:
-            # no change
-            pass
+            guest_cart = GuestCart(request.session)
+            errors = guest_cart.add(product)
+            summary = guest_cart.summary()
+            count = guest_cart.counts.get(str(product.pk))
+            cart_url = reverse("guest_cart")
+
+        return JsonResponse(
+            {
+                "errors": errors,
+                "item": {"product_pk": product.pk, "count": count or 0},
+                "cart": {"items": summary["items"], "price": summary["price"]},
+                "html": render_to_string(
+                    "transactions/cart_summary.html",
+                    {"cart_summary": summary, "cart_url": cart_url},
+                    request=request,
+                ),
+            }
+        )
 
-        return errors
 
-    def cart_count_price(self, cart=None):
-        """Count cart price"""
-        if cart is None:
-            cart = self.object
+class GuestCartView(TemplateView):
+    """Cart of not logged in visitor, kept in session."""
+
+    template_name = "transactions/guest_cart.html"
 
-        price = 0
-        for cart_item in cart.cart_items.all():
-            price += cart_item.product.price * cart_item.count
-        cart.price = price
-        cart.save()
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        items = GuestCart(self.request.session).items()
+        formset = GuestCartItemFormSet(
+            initial=[
+                {"product_pk": product.pk, "count": count} for product, count in items
+            ]
+        )
+        context["formset"] = formset
+        context["cart_items"] = list(
+            zip((product for product, count in items), formset)
+        )
+        context["price"] = sum(product.price * count for product, count in items)
+        return context
+
+    def post(self, request, *args, **kwargs):
+        cart = GuestCart(request.session)
+        errors = list()
+        if "delete_button" in request.POST:
+            cart.remove(request.POST["delete_button"])
+        elif "save_button" in request.POST or "buy_button" in request.POST:
+            formset = GuestCartItemFormSet(request.POST)
+            if formset.is_valid():
+                counts = {
+                    str(form.cleaned_data["product_pk"]): form.cleaned_data["count"]
+                    for form in formset
+                }
+                errors += cart.update(counts)
+            else:
+                errors.append("Count of product has to be a number.")
+        for error in errors:
+            messages.error(request, error)
+
+        if "buy_button" in request.POST and not errors:
+            return HttpResponseRedirect(reverse("guest_transaction"))
+        return HttpResponseRedirect(reverse("guest_cart"))
 
 
 class TransactionView(TemplateView):
@@ -201,11 +340,16 @@ class TransactionView(TemplateView):
         # form validation errors for address form
         kwargs["add_new_address_form"].errors.update(add_new_address_form_errors)
 
+        kwargs.update(self.get_methods_forms())
+
+        return super().get(self, request, *args, **kwargs)
+
+    def get_methods_forms(self):
         # shipping methods
         shipping_methods_choices = list()
         for shipping_method in self.shipping_methods:
             shipping_methods_choices.append((shipping_method, shipping_method))
-        kwargs["shipping_methods_form"] = RadioForm(
+        shipping_methods_form = RadioForm(
             choices=shipping_methods_choices, name="radio_shipping", required=True
         )
 
@@ -213,11 +357,14 @@ class TransactionView(TemplateView):
         payment_methods_choices = list()
         for payment_method in self.payment_methods:
             payment_methods_choices.append((payment_method, payment_method))
-        kwargs["payment_methods_form"] = RadioForm(
+        payment_methods_form = RadioForm(
             choices=payment_methods_choices, name="radio_payment", required=True
         )
 
-        return super().get(self, request, *args, **kwargs)
+        return {
+            "shipping_methods_form": shipping_methods_form,
+            "payment_methods_form": payment_methods_form,
+        }
 
     def post(self, request, *args, **kwargs):
         if "proceed_to_payment_button" in request.POST:
@@ -253,7 +400,7 @@ class TransactionView(TemplateView):
                     request.user.last_name = request.POST["last_name"]
                     request.user.save()
                 else:
-                    # TODO Guest transaction
+                    # Guests buy in GuestTransactionView.
                     pass
             else:
                 raise Exception(
@@ -274,19 +421,51 @@ class TransactionView(TemplateView):
 
             # Create transaction
             if request.user.is_authenticated:
-                # Get shopping cart
-                cart = request.user.carts.get(transaction=None)
-                # Create and add transaction to cart
-                cart.transaction = Transaction.objects.create(
-                    date=datetime.now(),
-                    status="",
-                    tracking_number="",
-                    address=address,
-                    shipping_method=shipping,
-                )
-                cart.save()
+                with transaction.atomic():
+                    # Locked items aren't returned to stock by release_reservations
+                    # while they are sold. Items it returned are missing from cart,
+                    # with rest of its items expired, items of cart expire together.
+                    reservations = list(
+                        CartItem.objects.filter(
+                            cart__user=request.user, cart__transaction=None
+                        )
+                        .select_for_update(of=("self",))
+                        .values_list("reserved_until", flat=True)
+                    )
+                    # Get shopping cart, with price at the time of transaction
+                    cart = request.user.carts.annotate(current_price=cart_price()).get(
+                        transaction=None
+                    )
+                    now = timezone.now()
+                    if not reservations or any(
+                        reserved_until is not None and reserved_until < now
+                        for reserved_until in reservations
+                    ):
+                        messages.error(
+                            request,
+                            "Reservation of products in cart expired, check your "
+                            "cart and buy again."
+                            if reservations
+                            else "Cart is empty.",
+                        )
+                        return HttpResponseRedirect(
+                            reverse("cart_details", kwargs={"pk": cart.pk})
+                        )
+                    cart.price = cart.current_price
+                    # Create and add transaction to cart
+                    cart.transaction = Transaction.objects.create(
+                        date=datetime.now(),
+                        status="",
+                        tracking_number="",
+                        address=address,
+                        shipping_method=shipping,
+                    )
+                    cart.save()
+                    # Products are sold, not reserved anymore.
+                    cart.cart_items.update(reserved_until=None)
+                invalidate_cart_summary(request.user.pk)
             else:
-                # TODO Guest transaction
+                # Guests buy in GuestTransactionView.
                 pass
 
             # payment method redirection
@@ -324,3 +503,65 @@ class TransactionStaffListView(StaffPrivilegesRequiredMixin, ListView):
     """View for managing transactions"""
 
     pass
+
+
+class GuestTransactionView(TransactionView):
+    """Transaction of not logged in visitor. Products of guest cart are taken from
+    stock and saved in cart without user only now."""
+
+    def get(self, request, *args, **kwargs):
+        if not GuestCart(request.session):
+            return HttpResponseRedirect(reverse("guest_cart"))
+        kwargs.setdefault("name_form", GuestForm())
+        kwargs.setdefault("add_new_address_form", GuestAddressForm())
+        kwargs.update(self.get_methods_forms())
+        return TemplateView.get(self, request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        guest_form = GuestForm(request.POST)
+        address_form = GuestAddressForm(request.POST)
+        shipping = request.POST.get("radio_shipping")
+        payment_method = request.POST.get("radio_payment")
+        forms_valid = guest_form.is_valid() & address_form.is_valid()
+        if (
+            not forms_valid
+            or shipping not in self.shipping_methods
+            or payment_method not in self.payment_methods
+        ):
+            return self.get(
+                request, name_form=guest_form, add_new_address_form=address_form
+            )
+        if payment_method != "cash on delivery":
+            return self.get(
+                request,
+                name_form=guest_form,
+                add_new_address_form=address_form,
+                payment_error=f"Method {payment_method} is not supported right now.",
+            )
+
+        cart = GuestCart(request.session)
+        with transaction.atomic():
+            taken, errors = take_stock(cart.counts)
+            if errors or not taken:
+                # Nothing is taken, guest decides what to buy.
+                transaction.set_rollback(True)
+                for error in errors:
+                    messages.error(request, error)
+                return HttpResponseRedirect(reverse("guest_cart"))
+            new_transaction = guest_form.save(commit=False)
+            new_transaction.date = datetime.now()
+            new_transaction.status = "pending for shipping"
+            new_transaction.address = address_form.save()
+            new_transaction.shipping_method = shipping
+            new_transaction.payment_method = payment_method
+            new_transaction.save()
+            sold_cart = Cart.objects.create(
+                transaction=new_transaction,
+                price=sum(product.price * count for product, count in taken.items()),
+            )
+            CartItem.objects.bulk_create(
+                CartItem(cart=sold_cart, product=product, count=count)
+                for product, count in taken.items()
+            )
+        cart.clear()
+        return HttpResponseRedirect(reverse("home"))